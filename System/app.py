@@ -1,5 +1,12 @@
-from flask import Flask, jsonify, render_template, request, send_from_directory, abort, session, redirect, url_for
-from functools import wraps
+from flask import Flask, jsonify, render_template, request, abort, session, redirect, url_for, g
+from flask.json.provider import JSONProvider
+from flask_caching import Cache
+from werkzeug.http import is_resource_modified
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice
+from datetime import datetime, timezone
+from function import JsonStorage
 from function.ContactListManager import ContactListManager
 from function.GroupManager import GroupManager
 from function.User import User
@@ -7,43 +14,236 @@ from function.AdminManager import AdminManager
 from function.Admin import Admin
 from function.ContactManager import ContactManager
 import os
-import json
+import hashlib
+import tempfile
+import threading
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson (stdlib json when orjson is missing)"""
+
+    def dumps(self, obj, **kwargs):
+        return JsonStorage.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return JsonStorage.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Write the encoded bytes straight into the response body
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(JsonStorage.dumps(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
+# Short-lived cache for read-only API responses (invalidated on writes, see below).
+# SimpleCache is per process; multi-worker servers use FileSystemCache (gunicorn_conf.py)
+cache = Cache(app, config={
+    'CACHE_TYPE': os.environ.get('CACHE_TYPE', 'SimpleCache'),
+    'CACHE_DIR': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'phonebook_cache')),
+    'CACHE_DEFAULT_TIMEOUT': 30
+})
+
 auth = User()
 admin_auth = Admin()
 admin_manager = AdminManager()
 
 # ===== DECORATORS =====
+# The decorators only tag the view with the role it needs; the check itself
+# runs once per request in check_route_role (no wrapper call per view).
+ROUTE_ROLES = {}  # endpoint -> 'login' | 'user' | 'admin' | None, filled on first hit
+
 def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
+    f.required_role = 'login'
+    return f
 
 def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user' not in session:
-            return redirect(url_for('login'))
-        if not session.get('is_admin', False):
-            abort(403)
-        return f(*args, **kwargs)
-    return decorated_function
+    f.required_role = 'admin'
+    return f
 
 def user_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user' not in session:
-            return redirect(url_for('login'))
-        if session.get('is_admin', False):
-            return redirect(url_for('admin_dashboard'))
-        return f(*args, **kwargs)
-    return decorated_function
+    f.required_role = 'user'
+    return f
+
+def read_only(f):
+    """POST view that changes no cached data (login, logout, checks): keeps the response cache"""
+    f.read_only = True
+    return f
+
+@app.before_request
+def check_route_role():
+    """Enforce the role of the requested endpoint (see decorators above)"""
+    endpoint = request.endpoint
+    try:
+        role = ROUTE_ROLES[endpoint]
+    except KeyError:
+        role = ROUTE_ROLES[endpoint] = getattr(app.view_functions.get(endpoint), 'required_role', None)
+    if role is None:
+        return None
+    if 'user' not in session:
+        return redirect(url_for('login'))
+    is_admin = session.get('is_admin', False)
+    if role == 'admin' and not is_admin:
+        abort(403)
+    if role == 'user' and is_admin:
+        return redirect(url_for('admin_dashboard'))
+    return None
+
+# ===== RESPONSE CACHE =====
+# Generations live outside the cache, which may prune them and restart a
+# counter at a value that still has cached views: the generation of an owner
+# is a counter stored in a small file, shared by all workers and never evicted
+CACHE_GENERATION_DIR = os.environ.get('CACHE_GENERATION_DIR',
+                                      os.path.join(tempfile.gettempdir(), 'phonebook_cache_gen'))
+os.makedirs(CACHE_GENERATION_DIR, exist_ok=True)
+
+def _generation_file(owner):
+    """Generation file of owner (hashed: usernames are not safe file names)"""
+    return os.path.join(CACHE_GENERATION_DIR, hashlib.sha256(str(owner).encode('utf-8')).hexdigest())
+
+def _cache_generation(owner):
+    """Current cache generation of a user ('*' = system-wide admin views)"""
+    try:
+        with open(_generation_file(owner), 'rb') as f:
+            return int(f.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def _bump_cache_generation(owner):
+    """Invalidate all cached responses of owner by moving to a new generation"""
+    path = _generation_file(owner)
+    # Locked increment (workers bump concurrently), atomic replace (readers
+    # never see a partial number)
+    with JsonStorage.file_lock(path):
+        JsonStorage.save_json(path, _cache_generation(owner) + 1)
+
+def _user_cache_key(*args, **kwargs):
+    """Cache key for per-user views (path + query string + user's generation)"""
+    user = session.get('user')
+    return f"view:{user}:{_cache_generation(user)}:{request.full_path}"
+
+def _system_cache_key(*args, **kwargs):
+    """Cache key for admin views that aggregate every user's data"""
+    return f"view:*:{_cache_generation('*')}:{request.full_path}"
+
+@app.after_request
+def invalidate_cache_on_write(response):
+    """Drop cached reads of the current user after a successful write"""
+    if getattr(app.view_functions.get(request.endpoint), 'read_only', False):
+        return response
+    if request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400:
+        user = session.get('user')
+        if user:
+            _bump_cache_generation(user)
+        _bump_cache_generation('*')
+    return response
+
+# ===== MANAGER POOL =====
+# Like a DB connection pool: a manager is checked out for one request and
+# returned on teardown, so an instance is never used by two threads at once.
+MANAGER_POOL_SIZE = 256  # (class, username) keys kept idle, least recently used dropped first
+_manager_pool = OrderedDict()  # (class, username) -> list of idle managers
+_manager_pool_lock = threading.Lock()
+
+def get_manager(cls, username):
+    """Check out a ContactListManager/ContactManager/GroupManager for username"""
+    key = (cls, username)
+    with _manager_pool_lock:
+        idle = _manager_pool.get(key)
+        manager = idle.pop() if idle else None
+    if manager is None:
+        manager = cls(username)
+    g.setdefault('checked_out_managers', []).append((key, manager))
+    return manager
+
+@app.teardown_request
+def release_managers(exc):
+    """Return the managers checked out by this request to the pool"""
+    checked_out = g.pop('checked_out_managers', None)
+    if not checked_out:
+        return
+    for _, manager in checked_out:
+        # Idle managers must not pin parsed files the shared cache has evicted
+        manager.clear_cache()
+    with _manager_pool_lock:
+        for key, manager in checked_out:
+            _manager_pool.setdefault(key, []).append(manager)
+            _manager_pool.move_to_end(key)
+        while len(_manager_pool) > MANAGER_POOL_SIZE:
+            _manager_pool.popitem(last=False)
+
+def evict_managers(username):
+    """Drop the pooled managers of username (logout / account deleted)"""
+    with _manager_pool_lock:
+        for key in [key for key in _manager_pool if key[1] == username]:
+            del _manager_pool[key]
+
+# ===== CONTACT LIST RESPONSES =====
+def _last_modified(*versions):
+    """Last-Modified for data read from files with these signatures (None = missing file)"""
+    mtimes = [version[0] for version in versions if version]
+    return datetime.fromtimestamp(max(mtimes) / 1e9, timezone.utc) if mtimes else None
+
+def contacts_response(manager):
+    """
+    All contacts of manager as a JSON array, sent from the bytes encoded once
+    per file version; 304 when the client's copy is current
+    """
+    body, etag = manager.get_all_json()
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.last_modified = _last_modified(manager.version())
+    return response.make_conditional(request)
+
+def groups_response(manager, contact_manager):
+    """
+    Groups with their contact_count. The validators come from the file
+    versions alone, so a 304 skips loading and encoding entirely
+    """
+    versions = (manager.version(), contact_manager.version())
+    etag = hashlib.blake2b(repr(versions).encode(), digest_size=8).hexdigest()
+    last_modified = _last_modified(*versions)
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        # Calculate contact_count for each group (one pass over contacts);
+        # copies, so the manager's cached group dicts are left untouched
+        counts = contact_manager.group_counts()
+        groups = [dict(group, contact_count=counts.get(str(group.get('name', '')).lower(), 0))
+                  for group in manager.get_all()]
+        response = jsonify({"success": True, "groups": groups})
+    else:
+        response = app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    return response
+
+# ===== REQUEST BODY =====
+def json_body():
+    """
+    JSON object sent in the request body, {} if there is none or it is invalid.
+    Decoded straight from the raw bytes (orjson when installed), without
+    Werkzeug keeping a second copy of the body
+    """
+    try:
+        data = JsonStorage.loads(request.get_data(cache=False))
+    except JsonStorage.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+# ===== STATIC PAGES =====
+@lru_cache(maxsize=64)
+def _render_cached(template, **context):
+    return render_template(template, **context)
+
+def render_page(template, **context):
+    """
+    render_template for pages whose output depends only on the arguments:
+    rendered once, then served from memory (re-rendered on every hit while
+    templates auto-reload, e.g. in debug mode)
+    """
+    if app.jinja_env.auto_reload:
+        return render_template(template, **context)
+    return _render_cached(template, **context)
 
 # ===== VIEWS =====
 @app.route("/")
@@ -58,23 +258,23 @@ def index():
 @user_required
 def dashboard():
     current_user = session.get('user', 'User')
-    return render_template("user/Contact_List.html", current_user=current_user)
+    return render_page("user/Contact_List.html", current_user=current_user)
 
 @app.route("/groups")
 @user_required
 def groups():
     current_user = session.get('user', 'User')
-    return render_template("user/Group.html", current_user=current_user)
+    return render_page("user/Group.html", current_user=current_user)
 
 @app.route("/add-group")
 @user_required
 def add_group():
-    return render_template("user/Add_New_Group.html")
+    return render_page("user/Add_New_Group.html")
 
 @app.route("/add-contact")
 @user_required
 def add_contact():
-    return render_template("user/Add_Contact.html")
+    return render_page("user/Add_Contact.html")
 
 @app.route("/login")
 def login():
@@ -83,7 +283,7 @@ def login():
         if session.get('is_admin'):
             return redirect(url_for('admin_dashboard'))
         return redirect(url_for('dashboard'))
-    return render_template("user/Login.html")
+    return render_page("user/Login.html")
 
 @app.route("/admin/login")
 def admin_login():
@@ -94,11 +294,11 @@ def admin_login():
 
 @app.route("/register")
 def register():
-    return render_template("user/Registration.html")
+    return render_page("user/Registration.html")
 
 @app.route("/forgot-password")
 def forgot_password():
-    return render_template("user/Forgot_Password.html")
+    return render_page("user/Forgot_Password.html")
 
 @app.route("/admin/dashboard")
 @admin_required
@@ -110,18 +310,19 @@ def admin_dashboard():
 @app.route("/admin/groups")
 @admin_required
 def admin_groups():
-    return render_template("admin/groups.html")
+    return render_page("admin/groups.html")
 
 @app.route("/admin/contacts")
 @admin_required
 def admin_contacts():
-    return render_template("admin/contacts.html")
+    return render_page("admin/contacts.html")
 
 # ===== AUTH API =====
 @app.route("/api/login", methods=["POST"])
+@read_only
 def api_unified_login():
     """Unified login for both admin and user"""
-    data = request.get_json() or {}
+    data = json_body()
     username = data.get("username")
     password = data.get("password")
     
@@ -142,13 +343,14 @@ def api_unified_login():
     return jsonify({"success": False, "message": "Invalid username or password"}), 401
 
 @app.route("/api/admin/login", methods=["POST"])
+@read_only
 def api_admin_login():
     """Legacy admin login - redirect to unified login"""
     return api_unified_login()
 
 @app.route("/api/register", methods=["POST"])
 def api_register():
-    data = request.get_json() or {}
+    data = json_body()
     username = data.get("username")
     password = data.get("password")
     security_question = data.get("security_question", "")
@@ -167,9 +369,10 @@ def api_security_question():
     return jsonify({"success": False, "message": "User not found"}), 404
 
 @app.route("/api/verify-security-answer", methods=["POST"])
+@read_only
 def api_verify_security_answer():
     """Verify security answer (FDD: Forgot Password flow)"""
-    data = request.get_json() or {}
+    data = json_body()
     username = data.get("username")
     answer = data.get("security_answer")
     
@@ -180,7 +383,7 @@ def api_verify_security_answer():
 
 @app.route("/api/reset-password", methods=["POST"])
 def api_reset_password():
-    data = request.get_json() or {}
+    data = json_body()
     username = data.get("username")
     security_answer = data.get("security_answer")
     new_password = data.get("new_password")
@@ -192,24 +395,37 @@ def api_reset_password():
 @app.route("/logout", methods=["GET"])
 def logout():
     """Logout route for direct link access"""
+    evict_managers(session.get('user'))
     session.clear()
     return redirect(url_for('login'))
 
 @app.route("/api/logout", methods=["POST"])
+@read_only
 def api_logout():
     """Logout API for AJAX calls"""
+    evict_managers(session.get('user'))
     session.clear()
     return jsonify({"success": True, "message": "Logged out"})
 
 # ===== ADMIN USER MANAGEMENT API =====
 @app.route("/admin/api/users", methods=["GET"])
 @admin_required
+@cache.cached(make_cache_key=_system_cache_key)
 def admin_get_users():
-    users = admin_manager.get_all_users()
+    # Optional paging (?offset=&limit=): only the requested page is built
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", type=int)
+    if limit is None and not offset:
+        users = admin_manager.get_all_users()
+    else:
+        offset = max(offset, 0)
+        stop = offset + max(limit, 0) if limit is not None else None
+        users = list(islice(admin_manager.iter_users(), offset, stop))
     return jsonify({"success": True, "users": users})
 
 @app.route("/admin/api/stats", methods=["GET"])
 @admin_required
+@cache.cached(make_cache_key=_system_cache_key)
 def admin_get_stats():
     stats = admin_manager.get_system_stats()
     return jsonify({"success": True, "stats": stats})
@@ -227,6 +443,8 @@ def admin_get_user(username):
 def admin_delete_user(username):
     success, message = admin_manager.delete_user(username)
     if success:
+        _bump_cache_generation(username)
+        evict_managers(username)
         return jsonify({"success": True, "message": message})
     return jsonify({"success": False, "message": message}), 400
 
@@ -244,19 +462,18 @@ def admin_get_contacts():
     """Get admin's contacts using ContactListManager"""
     admin_username = session.get('user')
     # For admin, use None username to access admin data directory
-    manager = ContactListManager(admin_username)
-    contacts = manager.get_all()
-    return jsonify(contacts)
+    manager = get_manager(ContactListManager, admin_username)
+    return contacts_response(manager)
 
 @app.route("/admin/api/contact", methods=["POST"])
 @admin_required
 def admin_add_update_contact():
     """Add or update admin's contact using ContactManager"""
     admin_username = session.get('user')
-    data = request.get_json() or {}
+    data = json_body()
     contact_id = data.get("id")
     
-    manager = ContactManager(admin_username)
+    manager = get_manager(ContactManager, admin_username)
     
     if contact_id:
         result = manager.update(contact_id, data)
@@ -272,7 +489,7 @@ def admin_add_update_contact():
 def admin_delete_contact():
     """Delete admin's contact using ContactListManager"""
     admin_username = session.get('user')
-    data = request.get_json() or {}
+    data = json_body()
     contact_id = data.get("id")
     
     if not contact_id:
@@ -283,7 +500,7 @@ def admin_delete_contact():
     except (ValueError, TypeError):
         return jsonify({"success": False, "message": "Invalid ID"}), 400
     
-    manager = ContactListManager(admin_username)
+    manager = get_manager(ContactListManager, admin_username)
     result = manager.delete(contact_id)
     
     if result.get("success"):
@@ -297,28 +514,17 @@ def admin_get_groups():
     """Get admin's groups using GroupManager"""
     admin_username = session.get('user')
     # Use None for shared admin groups
-    manager = GroupManager(username=None)
-    groups = manager.get_all()
-    
-    # Calculate contact_count for each group
-    contact_manager = ContactListManager(admin_username)
-    all_contacts = contact_manager.get_all()
-    
-    for group in groups:
-        group_name = group.get('name', '')
-        count = sum(1 for c in all_contacts if str(c.get('group', '')).lower() == str(group_name).lower())
-        group['contact_count'] = count
-    
-    return jsonify({"success": True, "groups": groups})
+    manager = get_manager(GroupManager, None)
+    return groups_response(manager, get_manager(ContactListManager, admin_username))
 
 @app.route("/admin/api/groups", methods=["POST", "PUT"])
 @admin_required
 def admin_add_update_group():
     """Add or update admin's group using GroupManager"""
-    data = request.get_json() or {}
+    data = json_body()
     group_id = data.get("id")
     
-    manager = GroupManager(username=None)
+    manager = get_manager(GroupManager, None)
     
     if group_id:
         result = manager.update(group_id, data)
@@ -333,7 +539,7 @@ def admin_add_update_group():
 @admin_required
 def admin_delete_group(group_id):
     """Delete admin's group using GroupManager"""
-    manager = GroupManager(username=None)
+    manager = get_manager(GroupManager, None)
     result = manager.delete(group_id)
     
     if result.get("success"):
@@ -345,9 +551,9 @@ def admin_delete_group(group_id):
 def admin_get_group_contacts(group_id):
     """Get contacts in a specific group using ContactListManager"""
     admin_username = session.get('user')
-    manager = ContactListManager(admin_username)
+    manager = get_manager(ContactListManager, admin_username)
     # Lookup group name from GroupManager (admin/shared groups)
-    gm = GroupManager(username=None)
+    gm = get_manager(GroupManager, None)
     group_res = gm.get(group_id)
     if not group_res.get('success'):
         return jsonify({"success": False, "message": "Group not found"}), 404
@@ -367,12 +573,12 @@ def api_contacts():
     username = session.get('user')
     if not username:
         return jsonify([])
-    manager = ContactListManager(username)
-    contacts = manager.get_all()
-    return jsonify(contacts)
+    manager = get_manager(ContactListManager, username)
+    return contacts_response(manager)
 
 @app.route("/api/search")
 @user_required
+@cache.cached(make_cache_key=_user_cache_key, timeout=15)
 def api_search():
     username = session.get('user')
     if not username:
@@ -380,16 +586,12 @@ def api_search():
     keyword = request.args.get("keyword", "")
     sort = request.args.get('sort', 'asc')
     by = request.args.get('by', 'name')
+    # match=prefix: typeahead, every term must start a word of the name
+    prefix = request.args.get('match') == 'prefix'
     
-    manager = ContactListManager(username)
-    results = manager.search(keyword) if keyword else manager.get_all()
-    # Sort the filtered results (don't sort the full data unintentionally)
-    try:
-        results = manager.sort_list(results, field=by, reverse=(sort == 'desc'))
-    except AttributeError:
-        # Backwards compatibility: if sort_list missing, fall back to sort()
-        results = manager.sort(field=by, reverse=(sort == 'desc'))
-
+    manager = get_manager(ContactListManager, username)
+    # Filter and sort in one call (empty keyword = all contacts)
+    results = manager.search(keyword, sort_by=by, reverse=(sort == 'desc'), prefix=prefix)
     return jsonify(results)
 
 @app.route('/api/sort_apply')
@@ -401,7 +603,7 @@ def api_sort_apply():
     sort = request.args.get('sort', 'asc')
     by = request.args.get('by', 'name')
     
-    manager = ContactListManager(username)
+    manager = get_manager(ContactListManager, username)
     contacts = manager.sort(field=by, reverse=(sort == 'desc'))
     return jsonify(contacts)
 
@@ -415,7 +617,7 @@ def api_filter_by_group():
     
     group = request.args.get('group', '')
     
-    manager = ContactListManager(username)
+    manager = get_manager(ContactListManager, username)
     contacts = manager.filter_by_group(group)
     return jsonify(contacts)
 
@@ -426,7 +628,7 @@ def api_delete_contact():
     if not username:
         return jsonify({"success": False, "message": "User not logged in"}), 401
     
-    data = request.get_json() or {}
+    data = json_body()
     item_id = data.get("id")
     
     try:
@@ -434,7 +636,7 @@ def api_delete_contact():
     except (ValueError, TypeError):
         return jsonify({"success": False, "message": "Invalid ID"}), 400
     
-    manager = ContactListManager(username)
+    manager = get_manager(ContactListManager, username)
     result = manager.delete(item_id)
     
     if result.get("success"):
@@ -449,10 +651,10 @@ def api_add_or_update_contact():
     if not username:
         return jsonify({"success": False, "message": "User not logged in"}), 401
     
-    data = request.get_json() or {}
+    data = json_body()
     contact_id = data.get("id")
     
-    manager = ContactManager(username)
+    manager = get_manager(ContactManager, username)
     
     # Use add or update based on presence of ID
     if contact_id:
@@ -470,28 +672,17 @@ def api_add_or_update_contact():
 def api_get_groups():
     """Get user's groups using GroupManager"""
     username = session.get('user')
-    manager = GroupManager(username)
-    groups = manager.get_all()
-    
-    # Calculate contact_count for each group
-    contact_manager = ContactListManager(username)
-    all_contacts = contact_manager.get_all()
-    
-    for group in groups:
-        group_name = group.get('name', '')
-        count = sum(1 for c in all_contacts if str(c.get('group', '')).lower() == str(group_name).lower())
-        group['contact_count'] = count
-    
-    return jsonify({"success": True, "groups": groups})
+    manager = get_manager(GroupManager, username)
+    return groups_response(manager, get_manager(ContactListManager, username))
 
 @app.route("/api/groups", methods=["POST"])
 @user_required
 def api_add_group():
     """Add new group using GroupManager"""
     username = session.get('user')
-    data = request.get_json() or {}
+    data = json_body()
     
-    manager = GroupManager(username)
+    manager = get_manager(GroupManager, username)
     result = manager.add(data)
     
     if result.get("success"):
@@ -503,7 +694,7 @@ def api_add_group():
 def api_delete_group(group_id):
     """Delete user's group using GroupManager"""
     username = session.get('user')
-    manager = GroupManager(username)
+    manager = get_manager(GroupManager, username)
     result = manager.delete(group_id)
     
     if result.get("success"):
@@ -516,7 +707,7 @@ def api_delete_group(group_id):
 def api_get_contact(contact_id):
     """Get single contact by ID"""
     username = session.get('user')
-    manager = ContactManager(username)
+    manager = get_manager(ContactManager, username)
     result = manager.get(contact_id)
     
     if result.get("success"):
@@ -528,9 +719,9 @@ def api_get_contact(contact_id):
 def api_update_contact(contact_id):
     """Update contact by ID"""
     username = session.get('user')
-    data = request.get_json() or {}
+    data = json_body()
     
-    manager = ContactManager(username)
+    manager = get_manager(ContactManager, username)
     result = manager.update(contact_id, data)
     
     if result.get("success"):
@@ -542,10 +733,10 @@ def api_update_contact(contact_id):
 def api_assign_contact_to_group(contact_id):
     """Assign contact to group (FDD: Assign Contact to Group)"""
     username = session.get('user')
-    data = request.get_json() or {}
+    data = json_body()
     group_name = data.get("group", "")
     
-    manager = ContactListManager(username)
+    manager = get_manager(ContactListManager, username)
     result = manager.assign_to_group(contact_id, group_name)
     
     if result.get("success"):
@@ -569,7 +760,7 @@ def api_get_profile():
 def api_update_profile():
     """Update current user's profile"""
     username = session.get('user')
-    data = request.get_json() or {}
+    data = json_body()
     
     result = auth.update_profile(username, data)
     
@@ -580,13 +771,18 @@ def api_update_profile():
 # ===== ERROR HANDLERS =====
 @app.errorhandler(403)
 def forbidden(e):
-    return render_template('403.html'), 403
+    return render_page('403.html'), 403
 
 @app.errorhandler(404)
 def not_found(e):
-    return render_template('403.html'), 404
+    return render_page('403.html'), 404
+
+@app.errorhandler(JsonStorage.LockTimeout)
+def data_busy(e):
+    return jsonify({"success": False, "message": "Data is busy, please try again"}), 503
 
 if __name__ == "__main__":
+    # Development server; production runs gunicorn -c gunicorn_conf.py wsgi:app
     app.run(
         host="0.0.0.0",
         port=5000,
@@ -2,11 +2,19 @@
 Admin Authentication Module - JSON Primary Storage
 Admin inherits from User according to Class Diagram
 """
-import json
 import os
 from datetime import datetime
 from typing import Optional, Tuple, Dict
 from .User import User
+from . import JsonStorage
+from .BaseAuthentication import DATA_DIR, cached_username_index, strip_plain_passwords
+
+ADMIN_ACCOUNT_DIR = os.path.join(DATA_DIR, 'Admin', 'admin_account')
+ADMIN_DATA_DIR = os.path.join(DATA_DIR, 'Admin', 'admin_data')
+ADMINS_FILE = os.path.join(ADMIN_ACCOUNT_DIR, 'admins.json')
+
+# Directories and admins.json are created by the first Admin() of the process only
+_storage_ready = False
 
 
 class Admin(User):
@@ -18,25 +26,41 @@ class Admin(User):
     def __init__(self):
         super().__init__()
         # Override directories for admin
-        self.admin_account_dir = os.path.join(self.data_dir, 'Admin', 'admin_account')
-        self.admin_data_dir = os.path.join(self.data_dir, 'Admin', 'admin_data')
-        self.admins_file = os.path.join(self.admin_account_dir, 'admins.json')
-        
-        # Ensure directories exist
-        os.makedirs(self.admin_account_dir, exist_ok=True)
-        os.makedirs(self.admin_data_dir, exist_ok=True)
-        
-        # Initialize admins.json if not exists
-        if not os.path.exists(self.admins_file):
-            with open(self.admins_file, 'w', encoding='utf-8') as f:
-                json.dump({"admins": []}, f, ensure_ascii=False, indent=2)
+        self.admin_account_dir = ADMIN_ACCOUNT_DIR
+        self.admin_data_dir = ADMIN_DATA_DIR
+        self.admins_file = ADMINS_FILE
+        self._admin_contacts_path = (self.admin_data_dir + os.sep + "{}_contacts.json").format
+        
+        global _storage_ready
+        if not _storage_ready:
+            # Ensure directories exist
+            os.makedirs(self.admin_account_dir, exist_ok=True)
+            os.makedirs(self.admin_data_dir, exist_ok=True)
+            
+            # Initialize admins.json if not exists
+            if not os.path.exists(self.admins_file):
+                JsonStorage.save_json(self.admins_file, {"admins": []})
+            _storage_ready = True
     
-    def _load_admins(self) -> Dict:
-        """Load admins from JSON"""
+    def _load_admins(self, use_cache: bool = True) -> Dict:
+        """
+        Load admins from JSON
+        
+        Args:
+            use_cache: Return the shared read-only snapshot (default); pass
+                False to get a private copy that may be modified and saved
+        """
+        if use_cache:
+            return self._cached_load(self.admins_file) or {"admins": []}
         return self._load_json(self.admins_file) or {"admins": []}
     
+    def _admins_index(self) -> Dict[str, Dict]:
+        """{username: admin} over the shared admins snapshot (read-only)"""
+        return cached_username_index(self.admins_file, 'admins')
+    
     def _save_admins(self, data: Dict):
         """Save admins to JSON"""
+        strip_plain_passwords(data.get('admins', []))
         self._save_json(self.admins_file, data)
     
     def login(self, username: str, password: str) -> Tuple[bool, str, Optional[Dict]]:
@@ -53,21 +77,25 @@ class Admin(User):
         if not username or not password:
             return False, "Please enter all information", None
         
-        data = self._load_admins()
-        admins = data.get('admins', [])
-        
-        # Find admin
-        admin = next((a for a in admins if a['username'] == username), None)
+        # Find admin (in the shared snapshot, so failed logins never copy the file)
+        admin = self._admins_index().get(username)
         
         if not admin:
             return False, "Admin account does not exist", None
         
-        if admin['password'] != self._hash_password(password):
+        if not self._check_password(admin.get('password'), password):
             return False, "Incorrect password", None
         
-        # Update last login
-        admin['last_login'] = datetime.now().isoformat()
-        self._save_admins(data)
+        # Update last login (on a private copy, locked so concurrent logins
+        # and registrations do not overwrite each other's changes)
+        with JsonStorage.file_lock(self.admins_file):
+            data = self._load_admins(use_cache=False)
+            for stored in data.get('admins', []):
+                if stored['username'] == username:
+                    stored['last_login'] = datetime.now().isoformat()
+                    admin = stored
+                    break
+            self._save_admins(data)
         
         return True, "Login successful", admin
     
@@ -91,44 +119,41 @@ class Admin(User):
         if not is_valid:
             return False, error_msg
         
-        data = self._load_admins()
-        admins = data.get('admins', [])
-        
-        # Check if username exists
-        if any(a['username'] == username for a in admins):
-            return False, "Admin username already exists"
-        
-        # Create new admin
-        hashed_password = self._hash_password(password)
-        
-        new_admin = {
-            "username": username,
-            "password": hashed_password,
-            "password_plain": password,
-            "email": email,
-            "full_name": full_name,
-            "role": role,
-            "created_at": datetime.now().isoformat(),
-            "last_login": None,
-            "permissions": ["view_users", "view_statistics"]
-        }
-        
-        admins.append(new_admin)
-        data['admins'] = admins
-        self._save_admins(data)
+        with JsonStorage.file_lock(self.admins_file):
+            # Check if username exists
+            if username in self._admins_index():
+                return False, "Admin username already exists"
+            
+            data = self._load_admins(use_cache=False)
+            admins = data.get('admins', [])
+            
+            # Create new admin
+            hashed_password = self._hash_password(password)
+            
+            new_admin = {
+                "username": username,
+                "password": hashed_password,
+                "email": email,
+                "full_name": full_name,
+                "role": role,
+                "created_at": datetime.now().isoformat(),
+                "last_login": None,
+                "permissions": ["view_users", "view_statistics"]
+            }
+            
+            admins.append(new_admin)
+            data['admins'] = admins
+            self._save_admins(data)
         
         # Create empty contacts file for admin
-        admin_contacts_file = os.path.join(self.admin_data_dir, f"{username}_contacts.json")
-        with open(admin_contacts_file, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+        admin_contacts_file = self._admin_contacts_path(username)
+        JsonStorage.save_json(admin_contacts_file, [])
         
         return True, "Admin registration successful"
     
     def get_admin_by_username(self, username: str) -> Optional[Dict]:
         """Get admin by username"""
-        data = self._load_admins()
-        admins = data.get('admins', [])
-        return next((a for a in admins if a['username'] == username), None)
+        return self._admins_index().get(username)
     
     def get_all_admins(self) -> list:
         """Get all admins"""
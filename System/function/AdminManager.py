@@ -1,114 +1,227 @@
 """
 Admin functionality module - JSON Primary Storage
 """
-import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
+from . import JsonStorage
+from .BaseAuthentication import BASE_DIR, DATA_DIR, cached_username_index, find_username, hash_password, strip_plain_passwords
+from .User import USER_ACCOUNT_DIR, USER_DATA_DIR, USERS_FILE
+
+# Contact count per contacts file, shared by all instances:
+# path -> (file signature, count). A file is only parsed again after it changed.
+_contact_counts: Dict[str, tuple] = {}
+
+# Recounting reads one small file per user; below this many users the
+# thread pool costs more than it saves
+PARALLEL_COUNT_THRESHOLD = 16
+COUNT_WORKERS = 8
 
 
 class AdminManager:
     def __init__(self):
-        self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.data_dir = os.path.join(self.base_dir, 'Data')
-        self.user_account_dir = os.path.join(self.data_dir, 'User', 'user_account')
-        self.user_data_dir = os.path.join(self.data_dir, 'User', 'user_data')
-        self.users_file = os.path.join(self.user_account_dir, 'users.json')
+        self.base_dir = BASE_DIR
+        self.data_dir = DATA_DIR
+        self.user_account_dir = USER_ACCOUNT_DIR
+        self.user_data_dir = USER_DATA_DIR
+        self.users_file = USERS_FILE
+        # Contacts file paths per username (JSON Lines, legacy JSON array),
+        # formatted instead of os.path.join per user
+        self._contacts_paths = (
+            (self.user_data_dir + os.sep + "{}_contacts.jsonl").format,
+            (self.user_data_dir + os.sep + "{}_contacts.json").format,
+        )
     
-    def _load_users(self) -> Dict:
-        """Load users from JSON"""
+    def _load_users(self, use_cache: bool = True) -> Dict:
+        """
+        Load users from JSON
+        
+        use_cache=True returns the shared read-only snapshot (re-parsed only
+        when users.json changes); pass False for a copy that may be modified
+        """
         try:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
+            if use_cache:
+                return JsonStorage.load_cached(self.users_file)
+            return JsonStorage.read_json(self.users_file)
+        except (OSError, JsonStorage.JSONDecodeError):
             return {"users": []}
     
     def _save_users(self, data: Dict):
-        """Save users to JSON"""
-        with open(self.users_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Save users to JSON (atomic replace, previous version kept as .bak)"""
+        strip_plain_passwords(data.get('users', []))
+        st = JsonStorage.save_json(self.users_file, data, backup=True)
+        JsonStorage.cache_put(self.users_file, data, st)
     
-    def _count_user_contacts(self, username: str) -> int:
-        """Count user's contacts"""
-        contacts_file = os.path.join(self.user_data_dir, f"{username}_contacts.json")
-        if not os.path.exists(contacts_file):
-            return 0
+    def _count_file(self, file_path: str, st: Optional[os.stat_result] = None) -> Optional[int]:
+        """Number of contacts in one contacts file (None if it does not exist)"""
+        try:
+            if st is None:
+                st = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        signature = JsonStorage.stat_signature(st)
+        cached = _contact_counts.get(file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
         try:
-            with open(contacts_file, 'r', encoding='utf-8') as f:
-                contacts = json.load(f)
-                return len(contacts) if isinstance(contacts, list) else 0
-        except:
-            return 0
+            if file_path.endswith(JsonStorage.JSONL_SUFFIX):
+                # One contact per line: count newlines, nothing is parsed
+                count = JsonStorage.count_jsonl(file_path)
+            else:
+                contacts = JsonStorage.read_json(file_path)
+                count = len(contacts) if isinstance(contacts, list) else 0
+        except FileNotFoundError:
+            return None
+        except (OSError, JsonStorage.JSONDecodeError):
+            count = 0
+        _contact_counts[file_path] = (signature, count)
+        return count
     
-    def get_all_users(self) -> List[Dict]:
-        """Get all users with contact count"""
-        data = self._load_users()
-        users = data.get('users', [])
+    def _scan_contact_files(self) -> Dict[str, os.stat_result]:
+        """{path: stat} of every file in user_data, from a single directory scan"""
+        try:
+            with os.scandir(self.user_data_dir) as entries:
+                return {entry.path: entry.stat() for entry in entries if entry.is_file()}
+        except FileNotFoundError:
+            return {}
+    
+    def _count_user_contacts(self, username: str, file_stats: Optional[Dict[str, os.stat_result]] = None) -> int:
+        """
+        Count user's contacts (JSON Lines file, or the legacy JSON array if not migrated yet)
         
-        # Add contact count to each user
-        for user in users:
-            user['contact_count'] = self._count_user_contacts(user.get('username', ''))
+        file_stats: result of _scan_contact_files, saves one stat per file
+        """
+        for contacts_path in self._contacts_paths:
+            file_path = contacts_path(username)
+            if file_stats is not None:
+                st = file_stats.get(file_path)
+                if st is None:
+                    continue
+                count = self._count_file(file_path, st)
+            else:
+                count = self._count_file(file_path)
+            if count is not None:
+                return count
+        return 0
+    
+    def _count_users_contacts(self, users: List[Dict]) -> List[int]:
+        """Contact count of every user in users, from one directory scan"""
+        file_stats = self._scan_contact_files()
+        
+        def count(user):
+            return self._count_user_contacts(user.get('username', ''), file_stats)
         
-        return users
+        if len(users) < PARALLEL_COUNT_THRESHOLD:
+            return [count(u) for u in users]
+        # I/O bound: file reads (and newline counting) release the GIL
+        with ThreadPoolExecutor(max_workers=COUNT_WORKERS) as pool:
+            return list(pool.map(count, users))
     
-    def get_user_by_username(self, username: str) -> Optional[Dict]:
-        """Get user by username"""
-        data = self._load_users()
-        users = data.get('users', [])
-        user = next((u for u in users if u['username'] == username), None)
+    def iter_users(self, query: str = "") -> Iterator[Dict]:
+        """
+        Yield users with contact count, lazily (callers that only need one
+        page stop early, e.g. with itertools.islice)
+        
+        Counts come from the contacts files (cached per file version), so
+        they are never out of step with the contacts themselves.
         
-        if user:
-            user['contact_count'] = self._count_user_contacts(username)
+        Args:
+            query: Only users whose username contains query (case-insensitive)
+        """
+        file_stats = self._scan_contact_files()
         
-        return user
+        def with_count(user):
+            # Copies: the loaded users are shared
+            return dict(user, contact_count=self._count_user_contacts(user.get('username', ''), file_stats))
+        
+        if not query:
+            data = self._load_users()
+            for user in data.get('users', []):
+                yield with_count(user)
+            return
+        
+        try:
+            entry = JsonStorage.load_cached_entry(self.users_file)
+        except (OSError, JsonStorage.JSONDecodeError):
+            return
+        users = entry.data.get('users', [])
+        # Case-folded usernames, built once per version of users.json
+        usernames = entry.derive('usernames_casefold', self._build_usernames_casefold)
+        
+        q = query.casefold()
+        for i, name in enumerate(usernames):
+            if q in name:
+                yield with_count(users[i])
+    
+    def get_all_users(self) -> List[Dict]:
+        """Get all users with contact count"""
+        return list(self.iter_users())
+    
+    def get_user_by_username(self, username: str) -> Optional[Dict]:
+        """Get user by username"""
+        user = cached_username_index(self.users_file, 'users').get(username)
+        return dict(user, contact_count=self._count_user_contacts(username)) if user else None
     
     def delete_user(self, username: str) -> tuple:
         """Delete user"""
         if username == "admin":
             return False, "Cannot delete admin account"
         
-        data = self._load_users()
-        users = data.get('users', [])
-        
-        # Find and remove user
-        user_found = False
-        new_users = []
-        for user in users:
-            if user.get('username') == username:
-                user_found = True
-                # Delete user's contacts file
-                contacts_file = os.path.join(self.user_data_dir, f"{username}_contacts.json")
-                if os.path.exists(contacts_file):
-                    os.remove(contacts_file)
-            else:
-                new_users.append(user)
-        
-        if not user_found:
-            return False, "User does not exist"
-        
-        data['users'] = new_users
-        self._save_users(data)
+        with JsonStorage.file_lock(self.users_file):
+            data = self._load_users(use_cache=False)
+            users = data.get('users', [])
+            
+            # Find and remove user
+            i = find_username(self.users_file, 'users', users, username)
+            if i is None:
+                return False, "User does not exist"
+            del users[i]
+            
+            # Delete user's contacts files (JSON Lines and legacy JSON) with
+            # their backups (which still hold the contacts), under the contacts
+            # lock so no contact write is in progress. The .lock files stay:
+            # removing one while another writer holds or waits on it would let
+            # the next writer lock a new inode and both would run at once.
+            for contacts_path in self._contacts_paths:
+                contacts_file = contacts_path(username)
+                with JsonStorage.file_lock(contacts_file):
+                    _contact_counts.pop(contacts_file, None)
+                    for path in (contacts_file, contacts_file + JsonStorage.BACKUP_SUFFIX):
+                        JsonStorage.cache_drop(path)
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+            
+            data['users'] = users
+            self._save_users(data)
         
         return True, f"Successfully deleted user {username}"
     
-    def update_user_password(self, username: str, new_password: str, hashed_password: str) -> tuple:
-        """Update user password"""
-        data = self._load_users()
-        users = data.get('users', [])
-        
-        user_found = False
-        for user in users:
-            if user.get('username') == username:
-                user['password'] = hashed_password
-                user['password_plain'] = new_password
-                user['password_updated_at'] = datetime.now().isoformat()
-                user_found = True
-                break
+    def update_user_password(self, username: str, new_password: str,
+                             hashed_password: Optional[str] = None) -> tuple:
+        """
+        Update user password (only the hash is stored)
         
-        if not user_found:
-            return False, "User does not exist"
-        
-        self._save_users(data)
+        Args:
+            username: User to update
+            new_password: New password in plaintext
+            hashed_password: Its hash, if the caller already computed it
+        """
+        if hashed_password is None:
+            hashed_password = hash_password(new_password)
+        with JsonStorage.file_lock(self.users_file):
+            data = self._load_users(use_cache=False)
+            users = data.get('users', [])
+            
+            i = find_username(self.users_file, 'users', users, username)
+            if i is None:
+                return False, "User does not exist"
+            
+            users[i].update(password=hashed_password, password_updated_at=datetime.now().isoformat())
+            
+            self._save_users(data)
         return True, "Password updated successfully"
     
     def get_system_stats(self) -> Dict:
@@ -118,7 +231,7 @@ class AdminManager:
         
         # Calculate stats
         total_users = len(users)
-        total_contacts = sum(self._count_user_contacts(u.get('username', '')) for u in users)
+        total_contacts = sum(self._count_users_contacts(users))
         
         # Recent registrations (last 7 days)
         recent_count = 0
@@ -143,20 +256,12 @@ class AdminManager:
     
     def search_users(self, query: str) -> List[Dict]:
         """Search users"""
-        if not query:
-            return self.get_all_users()
-        
-        data = self._load_users()
-        users = data.get('users', [])
-        
-        # Filter users by username
-        filtered_users = [u for u in users if query.lower() in u.get('username', '').lower()]
-        
-        # Add contact count
-        for user in filtered_users:
-            user['contact_count'] = self._count_user_contacts(user.get('username', ''))
-        
-        return filtered_users
+        return list(self.iter_users(query))
+    
+    @staticmethod
+    def _build_usernames_casefold(data: Dict) -> List[str]:
+        """Case-folded usernames, parallel to data['users']"""
+        return [str(u.get('username', '')).casefold() for u in data.get('users', [])]
 
 
 _admin_manager = AdminManager()
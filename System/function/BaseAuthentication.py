@@ -3,10 +3,97 @@ Base Authentication Module - Common authentication functionality
 Provides shared authentication methods for both User and Admin
 """
 import hashlib
-import json
+import hmac
 import os
-from datetime import datetime
 from typing import Dict, Optional, Tuple
+from . import JsonStorage
+
+# Paths are computed once per process, not per instance
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'Data')
+
+
+def _sha256_digest(password: str) -> bytes:
+    """
+    SHA256 digest of password, computed on every call.
+    
+    Deliberately not memoized: a cache would keep plaintext passwords and
+    answers in worker memory and its hits would show in response timing.
+    """
+    return hashlib.sha256(password.encode()).digest()
+
+
+def hash_password(password: str) -> str:
+    """Hex SHA256 hash of password, as stored in users.json / admins.json"""
+    return _sha256_digest(password).hex()
+
+
+def _index_by_username(data: dict, collection: str) -> Dict[str, dict]:
+    """{username: record} for data[collection] (first record wins, like a linear scan)"""
+    index = {}
+    for record in data.get(collection, []) if isinstance(data, dict) else []:
+        index.setdefault(record.get('username'), record)
+    return index
+
+
+def _positions_by_username(data: dict, collection: str) -> Dict[str, int]:
+    """{username: position in data[collection]} (first record wins)"""
+    positions = {}
+    for i, record in enumerate(data.get(collection, []) if isinstance(data, dict) else []):
+        positions.setdefault(record.get('username'), i)
+    return positions
+
+
+def strip_plain_passwords(records: list) -> list:
+    """
+    Remove the legacy cleartext fields (migrated on save): password_plain,
+    and security_answer, hashed into security_answer_hash if missing
+    """
+    for record in records:
+        record.pop('password_plain', None)
+        answer = record.pop('security_answer', None)
+        if answer is not None and not record.get('security_answer_hash'):
+            record['security_answer_hash'] = _sha256_digest(str(answer).lower().strip()).hex()
+    return records
+
+
+def cached_username_index(file_path: str, collection: str) -> Dict[str, dict]:
+    """
+    {username: record} over the shared snapshot of an accounts file,
+    rebuilt only when the file changes
+    
+    The records are shared: callers must not modify them.
+    
+    Args:
+        file_path: Path to users.json / admins.json
+        collection: Top-level key holding the records ('users' or 'admins')
+    """
+    try:
+        entry = JsonStorage.load_cached_entry(file_path)
+    except (FileNotFoundError, JsonStorage.JSONDecodeError):
+        return {}
+    return entry.derive('by_username', lambda data: _index_by_username(data, collection))
+
+
+def find_username(file_path: str, collection: str, records: list, username: str) -> Optional[int]:
+    """
+    Position of username in records, a fresh copy of the same accounts file
+    (read under its file_lock), using a {username: position} map cached per
+    file version instead of a linear scan
+    
+    Returns:
+        Index into records, None if the username does not exist
+    """
+    try:
+        entry = JsonStorage.load_cached_entry(file_path)
+    except (FileNotFoundError, JsonStorage.JSONDecodeError):
+        entry = None
+    if entry is not None:
+        i = entry.derive('positions', lambda data: _positions_by_username(data, collection)).get(username)
+        if i is None or (i < len(records) and records[i].get('username') == username):
+            return i
+    # records does not match the cached version: scan
+    return next((i for i, r in enumerate(records) if r.get('username') == username), None)
 
 
 class BaseAuthentication:
@@ -19,13 +106,41 @@ class BaseAuthentication:
         Args:
             account_type: Either 'user' or 'admin'
         """
-        self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.data_dir = os.path.join(self.base_dir, 'Data')
+        self.base_dir = BASE_DIR
+        self.data_dir = DATA_DIR
         self.account_type = account_type
         
     def _hash_password(self, password: str) -> str:
         """Hash password using SHA256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        return hash_password(password)
+    
+    def _hash_password_bytes(self, password: str) -> bytes:
+        """Raw SHA256 digest of password (no hex encoding)"""
+        return _sha256_digest(password)
+    
+    def _check_password(self, stored_hash: str, password: str) -> bool:
+        """
+        Check password against a stored hex SHA256 hash
+        (compares the raw digests in constant time)
+        """
+        try:
+            stored = bytes.fromhex(stored_hash)
+        except (TypeError, ValueError):
+            return False
+        return hmac.compare_digest(stored, self._hash_password_bytes(password))
+    
+    def _check_answer(self, record: dict, answer: str) -> bool:
+        """
+        Check a security answer (case/whitespace-insensitive) in constant time,
+        against the stored security_answer_hash when the record has one
+        (accounts registered before it was added only have the cleartext)
+        """
+        answer = (answer or '').lower().strip()
+        stored_hash = record.get('security_answer_hash')
+        if stored_hash:
+            return self._check_password(stored_hash, answer)
+        return hmac.compare_digest((record.get('security_answer') or '').lower().strip().encode(),
+                                   answer.encode())
     
     def _validate_credentials(self, username: str, password: str) -> Tuple[bool, str]:
         """
@@ -53,26 +168,46 @@ class BaseAuthentication:
             Dictionary with data or empty dict
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            return JsonStorage.read_json(file_path)
+        except (FileNotFoundError, JsonStorage.JSONDecodeError):
+            return {}
+    
+    def _cached_load(self, file_path: str) -> dict:
+        """
+        Load data from JSON file through the shared parse cache
+        (re-parsed only when the file changes)
+        
+        The returned data is shared: callers must not modify it.
+        
+        Args:
+            file_path: Path to JSON file
+            
+        Returns:
+            Dictionary with data or empty dict
+        """
+        try:
+            return JsonStorage.load_cached(file_path)
+        except (FileNotFoundError, JsonStorage.JSONDecodeError):
             return {}
     
-    def _save_json(self, file_path: str, data: dict) -> bool:
+    def _save_json(self, file_path: str, data: dict, derived: Optional[dict] = None) -> bool:
         """
-        Save data to JSON file
+        Save data to JSON file (atomically: temp file + rename, so readers
+        never see a half-written file)
         
         Args:
             file_path: Path to JSON file
             data: Dictionary to save
+            derived: Values already known for the saved version (e.g. next_id)
             
         Returns:
             True if successful, False otherwise
         """
         try:
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            st = JsonStorage.save_json(file_path, data, backup=True)
+            # Next _cached_load is a hit instead of a re-parse
+            JsonStorage.cache_put(file_path, data, st, derived)
             return True
         except Exception as e:
             print(f"[BaseAuth] Error saving to {file_path}: {e}")
@@ -92,3 +227,14 @@ class BaseAuthentication:
             return 1
         max_id = max((item.get('id', 0) for item in items), default=0)
         return max_id + 1
+    
+    def _next_id(self, file_path: str, collection: str) -> int:
+        """
+        Next free id in data[collection] of an accounts file; the max() scan
+        runs once per file version instead of on every call
+        """
+        try:
+            entry = JsonStorage.load_cached_entry(file_path)
+        except (FileNotFoundError, JsonStorage.JSONDecodeError):
+            return 1
+        return entry.derive('next_id', lambda data: self._generate_id(data.get(collection, [])))
@@ -2,9 +2,22 @@
 Contact - Single contact entity
 Public attributes: id, name, phone
 """
+import uuid
 from typing import Optional
 from datetime import datetime
 
+# Deletes every ASCII character except 0-9 in one C-level pass
+_NON_DIGITS = str.maketrans('', '', ''.join(chr(i) for i in range(128) if not chr(i).isdigit()))
+
+
+def normalize_phone(phone: str) -> str:
+    """Digits of a phone number ('090-123 4567' -> '0901234567')."""
+    digits = phone.translate(_NON_DIGITS)
+    if digits.isascii():
+        return digits
+    # Rare non-ASCII input: keep the exact str.isdigit() semantics
+    return ''.join(c for c in digits if c.isdigit())
+
 
 class Contact:
     """
@@ -16,6 +29,9 @@ class Contact:
         phone: Phone number (string)
     """
     
+    __slots__ = ('id', 'name', 'phone', 'email', 'address', 'group', 'notes',
+                 'avatar', '_phone_normalized', 'created_at', 'updated_at')
+    
     def __init__(self, id: str = None, name: str = "", phone: str = "", 
                  email: str = "", address: str = "", group: str = "", 
                  notes: str = "", avatar: str = ""):
@@ -32,7 +48,7 @@ class Contact:
             notes: Notes (optional)
             avatar: Avatar URL (optional)
         """
-        self.id = id or str(datetime.now().timestamp()).replace('.', '')
+        self.id = id or uuid.uuid4().hex
         self.name = name
         self.phone = phone
         self.email = email
@@ -40,9 +56,19 @@ class Contact:
         self.group = group
         self.notes = notes
         self.avatar = avatar
-        self.phone_normalized = ''.join(c for c in phone if c.isdigit())
-        self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
+        self._phone_normalized = None  # Computed on first access
+        self.created_at = self.updated_at = datetime.now().isoformat()
+    
+    @property
+    def phone_normalized(self) -> str:
+        """Digits of phone, computed on first access (after construction or a phone change)."""
+        if self._phone_normalized is None:
+            self._phone_normalized = normalize_phone(self.phone)
+        return self._phone_normalized
+    
+    @phone_normalized.setter
+    def phone_normalized(self, value: str):
+        self._phone_normalized = value
     
     def to_dict(self) -> dict:
         """Convert Contact to dictionary."""
@@ -62,20 +88,32 @@ class Contact:
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Contact':
-        """Create Contact from dictionary."""
-        contact = cls(
-            id=data.get('id'),
-            name=data.get('name', ''),
-            phone=data.get('phone', ''),
-            email=data.get('email', ''),
-            address=data.get('address', ''),
-            group=data.get('group', ''),
-            notes=data.get('notes', ''),
-            avatar=data.get('avatar', '')
-        )
-        contact.phone_normalized = data.get('phone_normalized', contact.phone_normalized)
-        contact.created_at = data.get('created_at', contact.created_at)
-        contact.updated_at = data.get('updated_at', contact.updated_at)
+        """
+        Create Contact from dictionary.
+        
+        Attributes are copied straight from data (no __init__), so loading
+        stored contacts never calls datetime.now(); only missing id or
+        timestamps are generated.
+        """
+        contact = cls.__new__(cls)
+        contact.id = data.get('id')
+        contact.name = data.get('name', '')
+        contact.phone = data.get('phone', '')
+        contact.email = data.get('email', '')
+        contact.address = data.get('address', '')
+        contact.group = data.get('group', '')
+        contact.notes = data.get('notes', '')
+        contact.avatar = data.get('avatar', '')
+        contact._phone_normalized = data.get('phone_normalized')
+        created_at = data.get('created_at')
+        updated_at = data.get('updated_at')
+        if not contact.id or created_at is None or updated_at is None:
+            now = datetime.now()
+            contact.id = contact.id or uuid.uuid4().hex
+            created_at = now.isoformat() if created_at is None else created_at
+            updated_at = now.isoformat() if updated_at is None else updated_at
+        contact.created_at = created_at
+        contact.updated_at = updated_at
         return contact
     
     def update(self, **kwargs):
@@ -84,9 +122,9 @@ class Contact:
             if hasattr(self, key) and key not in ['id', 'created_at']:
                 setattr(self, key, value)
         
-        # Update phone_normalized if phone changed
+        # Recompute phone_normalized lazily if phone changed
         if 'phone' in kwargs:
-            self.phone_normalized = ''.join(c for c in self.phone if c.isdigit())
+            self._phone_normalized = None
         
         self.updated_at = datetime.now().isoformat()
     
@@ -4,9 +4,38 @@ Combines all functions: CRUD, Search, Sort, Filter following OOP design.
 """
 from __future__ import annotations
 import os
-import json
+import hashlib
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from typing import Dict, List, Optional, Any
 from datetime import datetime
+from . import JsonStorage
+from .Contact import normalize_phone
+
+_lower = str.lower
+
+# Letters Unicode does not decompose into base letter + accent ('đ' is a
+# letter of its own, so NFD keeps it); folded like the stripped accents
+_UNDECOMPOSED = str.maketrans({'đ': 'd'})
+
+# Joins a contact's normalized search fields into one string (a control
+# character that never appears in a search query)
+_FIELD_SEPARATOR = '\x1f'
+
+
+def _field_text(contact: Dict[str, Any], field: str) -> str:
+    """contact[field] as a string, '' if missing (validated fields are already strings)."""
+    value = contact.get(field)
+    if value.__class__ is str:
+        return value
+    return '' if value is None else str(value)
+
+# Resolved once at import; the directory is created here instead of on every
+# manager instance (one per request)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_DATA_DIR = os.path.join(BASE_DIR, 'Data', 'User', 'user_data')
+os.makedirs(USER_DATA_DIR, exist_ok=True)
 
 
 class ContactListManager:
@@ -28,19 +57,22 @@ class ContactListManager:
             username: User's login name
         """
         self.username = username
-        self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.data_dir = os.path.join(self.base_dir, 'Data', 'User', 'user_data')
+        self.base_dir = BASE_DIR
+        self.data_dir = USER_DATA_DIR
         self._cache: Optional[List[Dict[str, Any]]] = None  # Cache to improve performance
-        
-        # Ensure data directory exists
-        os.makedirs(self.data_dir, exist_ok=True)
+        self._id_index: Optional[Dict[int, int]] = None  # contact id -> position in _cache
+        self._entry: Optional[JsonStorage.CachedFile] = None  # Shared cache entry behind _cache
+        # Resolved once: every operation needs it
+        self._file_path = os.path.join(USER_DATA_DIR, f"{username}_contacts.jsonl") if username else None
     
     # ==================== PRIVATE METHODS ====================
     
     def _get_contacts_file(self) -> Optional[str]:
-        """Get path to user's contacts file."""
-        if not self.username:
-            return None
+        """Get path to user's contacts file (JSON Lines, one contact per line)."""
+        return self._file_path
+    
+    def _get_legacy_contacts_file(self) -> str:
+        """Path of the pre-JSONL contacts file (a JSON array), migrated on first load."""
         return os.path.join(self.data_dir, f"{self.username}_contacts.json")
     
     def _load_contacts(self, use_cache: bool = True) -> List[Dict[str, Any]]:
@@ -57,28 +89,68 @@ class ContactListManager:
         if use_cache and self._cache is not None:
             return self._cache
         
+        self._id_index = None
+        self._entry = None
         file_path = self._get_contacts_file()
-        if not file_path or not os.path.exists(file_path):
+        if not file_path:
             self._cache = []
             return []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                contacts = data if isinstance(data, list) else []
-                self._cache = contacts
-                return contacts
-        except (json.JSONDecodeError, IOError) as e:
+            if use_cache:
+                # Shared parse cache: only re-reads the file after it changed
+                entry = JsonStorage.load_cached_entry(file_path)
+                data = entry.data
+                if isinstance(data, list):
+                    self._entry = entry
+                    self._id_index = entry.derive('id_index', self._build_id_index)
+            else:
+                # Fresh copy for callers that mutate the list
+                data = JsonStorage.read_json(file_path)
+            contacts = data if isinstance(data, list) else []
+            self._cache = contacts
+            return contacts
+        except FileNotFoundError:
+            # Not migrated yet: convert the legacy JSON array file once
+            try:
+                migrated = JsonStorage.migrate_to_jsonl(self._get_legacy_contacts_file(), file_path)
+            except (OSError, JsonStorage.JSONDecodeError) as e:
+                # Unreadable legacy file: log it and serve no contacts, as for a broken file
+                print(f"[ContactListManager] Error loading contacts: {e}")
+                migrated = False
+            if migrated:
+                return self._load_contacts(use_cache)
+            # No contacts saved yet (cheaper than checking before every read)
+            self._cache = []
+            return []
+        except (JsonStorage.JSONDecodeError, IOError) as e:
             print(f"[ContactListManager] Error loading contacts: {e}")
             self._cache = []
             return []
     
-    def _save_contacts(self, contacts: List[Dict[str, Any]]) -> bool:
+    def _load_for_write(self) -> List[Dict[str, Any]]:
+        """
+        Contacts list to modify and save, for callers holding file_lock.
+        
+        The shared list is revalidated against the file (re-parsed only if it
+        changed) and copied shallowly, so a write never re-parses the file.
+        The contact dicts are still shared: replace them, never modify them.
+        """
+        self._cache = None
+        return list(self._load_contacts())
+    
+    def _save_contacts(self, contacts: List[Dict[str, Any]], next_id: Optional[int] = None,
+                       id_index: Optional[Dict[int, int]] = None,
+                       phone_index: Optional[Dict[str, List[int]]] = None) -> bool:
         """
         Save contacts list to JSON file and update cache.
         
         Args:
             contacts: List of contacts to save
+            next_id: Next free contact id, if the caller already knows it
+            id_index: Id index still valid for contacts (no contact moved),
+                so it is not rebuilt on the next lookup
+            phone_index: Phone index valid for contacts, kept the same way
         
         Returns:
             True if successful, False if error
@@ -88,15 +160,95 @@ class ContactListManager:
             return False
         
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(contacts, f, ensure_ascii=False, indent=2)
+            st = JsonStorage.save_json(file_path, contacts, backup=True)
+            if next_id is None and self._entry is not None:
+                # Rewrites never add ids: the counter of the version we loaded
+                # still holds, so the next add skips the max() scan
+                next_id = self._entry.derived.get('next_id')
             # Update cache
+            if self._cache is not contacts:
+                self._cache = contacts
+                self._id_index = id_index
+            derived = {}
+            if self._id_index is not None:
+                derived['id_index'] = self._id_index
+            if next_id is not None:
+                derived['next_id'] = next_id
+            if phone_index is not None:
+                derived['phone_index'] = phone_index
+            self._entry = JsonStorage.cache_put(file_path, contacts, st, derived or None)
+            return True
+        except IOError as e:
+            print(f"[ContactListManager] Error saving contacts: {e}")
+            return False
+    
+    def _append_contact(self, contacts: List[Dict[str, Any]], next_id: int) -> bool:
+        """
+        Append the last contact of contacts to the file (O(1) write) and update cache.
+        
+        Args:
+            contacts: Full contacts list, new contact already appended
+            next_id: Next free contact id
+        
+        Returns:
+            True if successful, False if error
+        """
+        file_path = self._get_contacts_file()
+        if not file_path:
+            return False
+        
+        try:
+            new_contact = contacts[-1]
+            phone_index = self._patched_phone_index(new_contact.get('id'), new_phone=new_contact.get('phone', ''))
+            st = JsonStorage.append_jsonl(file_path, new_contact)
+            derived = {'next_id': next_id}
+            if self._id_index is not None:
+                # Patch a copy: the old index belongs to the previous (shared) version
+                derived['id_index'] = dict(self._id_index)
+                derived['id_index'][new_contact.get('id')] = len(contacts) - 1
+            if phone_index is not None:
+                derived['phone_index'] = phone_index
             self._cache = contacts
+            self._id_index = derived.get('id_index')
+            self._entry = JsonStorage.cache_put(file_path, contacts, st, derived)
             return True
         except IOError as e:
             print(f"[ContactListManager] Error saving contacts: {e}")
             return False
     
+    @staticmethod
+    def _build_id_index(contacts: List[Dict[str, Any]]) -> Dict[int, int]:
+        """Map contact id -> position in the contacts list."""
+        return {contact.get('id'): i for i, contact in enumerate(contacts)}
+    
+    def _build_search_index(self, contacts: List[Dict[str, Any]]) -> tuple:
+        """
+        Build the search index for SEARCHABLE_FIELDS.
+
+        Returns:
+            (values, trigrams): normalized searchable fields per contact,
+            joined into one string by _FIELD_SEPARATOR, and
+            trigram -> set of contact positions containing it
+        """
+        values = []
+        trigrams: Dict[str, set] = {}
+        for i, contact in enumerate(contacts):
+            normalized = tuple(self._field_search_text(contact, field)
+                               for field in self.SEARCHABLE_FIELDS)
+            values.append(_FIELD_SEPARATOR.join(normalized))
+            grams = set()
+            for text in normalized:
+                grams.update(text[j:j + 3] for j in range(len(text) - 2))
+            for gram in grams:
+                trigrams.setdefault(gram, set()).add(i)
+        return values, trigrams
+    
+    def _find_index(self, contact_id: int) -> Optional[int]:
+        """Position of a contact in the loaded list, or None (O(1) via id index)."""
+        if self._id_index is None:
+            self._id_index = self._build_id_index(self._cache or [])
+        return self._id_index.get(contact_id)
+    
     def _generate_id(self, contacts: List[Dict[str, Any]]) -> int:
         """Generate new ID for contact."""
         if not contacts:
@@ -104,6 +256,13 @@ class ContactListManager:
         max_id = max((contact.get('id', 0) for contact in contacts), default=0)
         return max_id + 1
     
+    def _next_id(self, contacts: List[Dict[str, Any]]) -> int:
+        """Next free contact id: kept with the cache entry, scanned only once per file version."""
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            return entry.derive('next_id', self._generate_id)
+        return self._generate_id(contacts)
+    
     def _validate_contact(self, contact_data: Dict[str, Any]) -> tuple[bool, str]:
         """
         Validate contact data.
@@ -118,7 +277,7 @@ class ContactListManager:
         
         # Validate phone format
         phone = contact_data.get('phone', '').strip()
-        phone_digits = ''.join(c for c in phone if c.isdigit())
+        phone_digits = normalize_phone(phone)
         if len(phone_digits) < 9:
             return False, "Invalid phone number (minimum 9 digits)"
         
@@ -141,31 +300,74 @@ class ContactListManager:
         Returns:
             True if duplicate, False if OK
         """
-        phone_digits = ''.join(c for c in phone if c.isdigit())
+        phone_digits = normalize_phone(phone)
         
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            index = entry.derive('phone_index', self._build_phone_index)
+        else:
+            index = self._build_phone_index(contacts)
+        
+        return any(not (exclude_id and contact_id == exclude_id)
+                   for contact_id in index.get(phone_digits, ()))
+    
+    @staticmethod
+    def _build_phone_index(contacts: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Map phone digits -> ids of the contacts with that number."""
+        index: Dict[str, List[int]] = {}
         for contact in contacts:
-            if exclude_id and contact.get('id') == exclude_id:
-                continue
-            
-            existing_phone = ''.join(c for c in str(contact.get('phone', '')) if c.isdigit())
-            if phone_digits == existing_phone:
-                return True
-        return False
+            digits = normalize_phone(str(contact.get('phone', '')))
+            index.setdefault(digits, []).append(contact.get('id'))
+        return index
+    
+    def _patched_phone_index(self, contact_id: int, old_phone: Optional[str] = None,
+                             new_phone: Optional[str] = None) -> Optional[Dict[str, List[int]]]:
+        """
+        Phone index of the loaded version with contact_id moved from
+        old_phone to new_phone (None = not in the list before / after), for
+        the entry of the next version. None if the index was never built.
+        
+        The old index and its id lists belong to the shared entry: the dict
+        and the changed lists are copied, never modified.
+        """
+        index = self._cached_phone_index()
+        if index is None:
+            return None
+        index = dict(index)
+        if old_phone is not None:
+            digits = normalize_phone(str(old_phone))
+            ids = [i for i in index.get(digits, ()) if i != contact_id]
+            if ids:
+                index[digits] = ids
+            else:
+                index.pop(digits, None)
+        if new_phone is not None:
+            digits = normalize_phone(str(new_phone))
+            index[digits] = index.get(digits, []) + [contact_id]
+        return index
+    
+    def _cached_phone_index(self) -> Optional[Dict[str, List[int]]]:
+        """Phone index of the loaded version if it was built (still valid when no phone changed)."""
+        entry = self._entry
+        return entry.derived.get('phone_index') if entry is not None else None
     
     def _normalize_text(self, text: str) -> str:
-        """Normalize text for search (lowercase, remove accents)."""
-        import unicodedata
+        """Normalize text for search (case-fold, remove accents, 'đ' -> 'd')."""
+        if text.isascii():
+            # No accents to remove: skip the Unicode decomposition
+            # (lower() equals casefold() on ASCII)
+            return text.lower()
         # Remove accents
-        nfd = unicodedata.normalize('NFD', text)
+        nfd = unicodedata.normalize('NFD', text.casefold())
         text_no_accents = ''.join(c for c in nfd if not unicodedata.combining(c))
-        return text_no_accents.lower()
+        return text_no_accents.translate(_UNDECOMPOSED)
     
     def _get_sort_key(self, contact: Dict[str, Any], field: str) -> Any:
         """Get sort key for a contact based on field."""
         if field == 'phone':
             # Extract digits only for numeric sort
             phone = contact.get('phone', '')
-            digits = ''.join(c for c in str(phone) if c.isdigit())
+            digits = normalize_phone(str(phone))
             return int(digits) if digits else 0
         elif field in ['created_at', 'updated_at']:
             # Sort by datetime
@@ -173,6 +375,44 @@ class ContactListManager:
         else:
             # Default: string sort (case-insensitive)
             return str(contact.get(field, '')).lower()
+
+    def _sort_keys(self, contacts: List[Dict[str, Any]], field: str) -> List[Any]:
+        """
+        Sort key of every contact for field. Kept with the shared cache entry
+        (computed once per file version and field) when contacts is the
+        cached list.
+        """
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            return entry.derive(f'sort_keys:{field}', lambda data: self._build_sort_keys(data, field))
+        return self._build_sort_keys(contacts, field)
+    
+    def _build_sort_keys(self, contacts: List[Dict[str, Any]], field: str) -> List[Any]:
+        if field == 'name':
+            # Hot path: skip the per-contact field dispatch
+            return [_lower(str(c.get('name', ''))) for c in contacts]
+        return [self._get_sort_key(c, field) for c in contacts]
+    
+    def _sorted(self, contacts: List[Dict[str, Any]], field: str, reverse: bool) -> List[Dict[str, Any]]:
+        """
+        Decorate-sort-undecorate: compute every sort key once up front, then
+        sort positions by key. Equal keys keep their original order in both
+        directions, like sorted(..., reverse=...).
+        
+        For the whole cached list the order itself is kept with the cache
+        entry too (per field and direction), so repeated full listings skip
+        the sort.
+        """
+        def build(data):
+            keys = self._sort_keys(data, field)
+            return sorted(range(len(data)), key=keys.__getitem__, reverse=reverse)
+        
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            order = entry.derive(f'sort_order:{field}:{int(reverse)}', build)
+        else:
+            order = build(contacts)
+        return [contacts[i] for i in order]
     
     # ==================== PUBLIC CRUD METHODS ====================
     
@@ -191,9 +431,9 @@ class ContactListManager:
         
         contacts = self._load_contacts()
         
-        for contact in contacts:
-            if contact.get('id') == contact_id:
-                return {"success": True, "contact": contact}
+        idx = self._find_index(contact_id)
+        if idx is not None:
+            return {"success": True, "contact": contacts[idx]}
         
         return {"success": False, "message": "Contact not found"}
     
@@ -209,9 +449,45 @@ class ContactListManager:
         """
         return self._load_contacts(use_cache=use_cache)
     
+    def clear_cache(self):
+        """Drop the instance cache; the next read revalidates against the file."""
+        self._cache = None
+        self._id_index = None
+        self._entry = None
+    
+    def version(self) -> Optional[tuple]:
+        """Signature (mtime_ns, size, inode) of the loaded contacts file, None if there is none."""
+        contacts = self._load_contacts()
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            return entry.signature
+        file_path = self._get_contacts_file()
+        return JsonStorage.file_signature(file_path) if file_path else None
+    
+    def get_all_json(self) -> tuple:
+        """
+        Get all contacts already encoded as a JSON array.
+        
+        Encoded once per file version and kept with the shared cache entry.
+        
+        Returns:
+            (body, etag): JSON bytes and a hash of them for HTTP caching
+        """
+        contacts = self._load_contacts()
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            return entry.derive('json', self._encode_contacts)
+        return self._encode_contacts(contacts)
+    
+    @staticmethod
+    def _encode_contacts(contacts: List[Dict[str, Any]]) -> tuple:
+        """Encode contacts to JSON bytes plus their ETag."""
+        body = JsonStorage.dumps(contacts)
+        return body, hashlib.blake2b(body, digest_size=8).hexdigest()
+    
     def reload(self) -> ContactListManager:
         """Force reload data from file (clear cache)."""
-        self._cache = None
+        self.clear_cache()
         self._load_contacts(use_cache=False)
         return self
     
@@ -233,38 +509,49 @@ class ContactListManager:
         if not is_valid:
             return {"success": False, "message": message}
         
-        # Load existing contacts
-        contacts = self._load_contacts(use_cache=False)  # Force reload
-        
-        # Check duplicate phone
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            # Load existing contacts (revalidated now that we hold the lock)
+            self._cache = None
+            shared = self._load_contacts()
+            new_id = self._next_id(shared)
+            # New list for the append; the cached one is shared with other readers.
+            # Existing contact dicts are not modified, so a shallow copy is enough.
+            contacts = list(shared)
+            
+            # Check duplicate phone (against the shared list: its phone index is cached)
+            phone = contact_data.get('phone', '').strip()
+            if self._check_duplicate_phone(shared, phone):
+                return {"success": False, "message": "Phone number already exists in contact list"}
+            
+            new_contact = self._new_contact(contact_data, new_id)
+            
+            # Add to list
+            contacts.append(new_contact)
+            
+            # Save (append one line, the rest of the file is untouched)
+            if self._append_contact(contacts, next_id=new_id + 1):
+                return {"success": True, "message": "Contact added successfully", "contact": new_contact}
+            else:
+                return {"success": False, "message": "Error saving file"}
+    
+    def _new_contact(self, contact_data: Dict[str, Any], contact_id: int) -> Dict[str, Any]:
+        """Build a new contact record from validated input."""
         phone = contact_data.get('phone', '').strip()
-        if self._check_duplicate_phone(contacts, phone):
-            return {"success": False, "message": "Phone number already exists in contact list"}
-        
+        now = datetime.now().isoformat()
         # Create new contact with normalized phone (per ER Diagram)
-        phone_normalized = ''.join(c for c in phone if c.isdigit())
-        new_contact = {
-            "id": self._generate_id(contacts),
+        return {
+            "id": contact_id,
             "name": contact_data.get('name', '').strip(),
             "phone": phone,
-            "phone_normalized": phone_normalized,
+            "phone_normalized": normalize_phone(phone),
             "email": contact_data.get('email', '').strip(),
             "address": contact_data.get('address', '').strip(),
             "group": contact_data.get('group', '').strip(),
             "notes": contact_data.get('notes', '').strip(),
             "avatar": contact_data.get('avatar', ''),
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
+            "created_at": now,
+            "updated_at": now
         }
-        
-        # Add to list
-        contacts.append(new_contact)
-        
-        # Save
-        if self._save_contacts(contacts):
-            return {"success": True, "message": "Contact added successfully", "contact": new_contact}
-        else:
-            return {"success": False, "message": "Error saving file"}
     
     def update(self, contact_id: int, contact_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -285,38 +572,45 @@ class ContactListManager:
         if not is_valid:
             return {"success": False, "message": message}
         
-        # Load existing contacts
-        contacts = self._load_contacts(use_cache=False)
-        
-        # Check duplicate phone
-        phone = contact_data.get('phone', '').strip()
-        if self._check_duplicate_phone(contacts, phone, exclude_id=contact_id):
-            return {"success": False, "message": "Phone number already exists in contact list"}
-        
-        # Find and update contact with normalized phone (per ER Diagram)
-        phone_normalized = ''.join(c for c in phone if c.isdigit())
-        for i, contact in enumerate(contacts):
-            if contact.get('id') == contact_id:
-                updated_contact = {
-                    **contact,
-                    "name": contact_data.get('name', '').strip(),
-                    "phone": phone,
-                    "phone_normalized": phone_normalized,
-                    "email": contact_data.get('email', '').strip(),
-                    "address": contact_data.get('address', '').strip(),
-                    "group": contact_data.get('group', '').strip(),
-                    "notes": contact_data.get('notes', '').strip(),
-                    "avatar": contact_data.get('avatar', contact.get('avatar', '')),
-                    "updated_at": datetime.now().isoformat()
-                }
-                contacts[i] = updated_contact
-                
-                if self._save_contacts(contacts):
-                    return {"success": True, "message": "Update successful", "contact": updated_contact}
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Contact not found"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            # Load existing contacts
+            contacts = self._load_for_write()
+            
+            # Check duplicate phone (against the shared list: its phone index is cached)
+            phone = contact_data.get('phone', '').strip()
+            if self._check_duplicate_phone(self._cache, phone, exclude_id=contact_id):
+                return {"success": False, "message": "Phone number already exists in contact list"}
+            
+            # Find and update contact with normalized phone (per ER Diagram)
+            phone_normalized = normalize_phone(phone)
+            i = self._find_index(contact_id)
+            if i is None:
+                return {"success": False, "message": "Contact not found"}
+            
+            contact = contacts[i]
+            # Build a new dict rather than mutating contact: it is shared with the
+            # cached list (and other readers), whose derived indexes would go stale
+            # and which must stay intact if the save fails.
+            updated_contact = {
+                **contact,
+                "name": contact_data.get('name', '').strip(),
+                "phone": phone,
+                "phone_normalized": phone_normalized,
+                "email": contact_data.get('email', '').strip(),
+                "address": contact_data.get('address', '').strip(),
+                "group": contact_data.get('group', '').strip(),
+                "notes": contact_data.get('notes', '').strip(),
+                "avatar": contact_data.get('avatar', contact.get('avatar', '')),
+                "updated_at": datetime.now().isoformat()
+            }
+            contacts[i] = updated_contact
+            phone_index = self._patched_phone_index(contact_id, old_phone=contact.get('phone', ''), new_phone=phone)
+            
+            # Replaced in place: every position, and so the id index, is unchanged
+            if self._save_contacts(contacts, id_index=self._id_index, phone_index=phone_index):
+                return {"success": True, "message": "Update successful", "contact": updated_contact}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     def delete(self, contact_id: int) -> Dict[str, Any]:
         """
@@ -331,19 +625,28 @@ class ContactListManager:
         if not self.username:
             return {"success": False, "message": "Not logged in"}
         
-        contacts = self._load_contacts(use_cache=False)
-        
-        # Find and remove contact
-        for i, contact in enumerate(contacts):
-            if contact.get('id') == contact_id:
-                contacts.pop(i)
-                
-                if self._save_contacts(contacts):
-                    return {"success": True, "message": "Contact deleted successfully"}
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Contact not found"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            contacts = self._load_for_write()
+            
+            # Find and remove contact
+            i = self._find_index(contact_id)
+            if i is None:
+                return {"success": False, "message": "Contact not found"}
+            
+            # Swap-pop: move the last contact into the gap (file order is not
+            # meaningful, callers sort), so only one position changes
+            phone_index = self._patched_phone_index(contact_id, old_phone=contacts[i].get('phone', ''))
+            last = contacts.pop()
+            id_index = dict(self._id_index)  # The old index belongs to the shared list
+            del id_index[contact_id]
+            if i < len(contacts):
+                contacts[i] = last
+                id_index[last.get('id')] = i
+            
+            if self._save_contacts(contacts, id_index=id_index, phone_index=phone_index):
+                return {"success": True, "message": "Contact deleted successfully"}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     def delete_all(self) -> Dict[str, Any]:
         """
@@ -355,47 +658,201 @@ class ContactListManager:
         if not self.username:
             return {"success": False, "message": "Not logged in"}
         
-        contacts = self._load_contacts(use_cache=False)
-        count = len(contacts)
-        
-        if self._save_contacts([]):
-            return {"success": True, "message": f"Deleted {count} contacts", "count": count}
-        else:
-            return {"success": False, "message": "Error saving file"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            self._cache = None
+            count = len(self._load_contacts())
+            
+            if self._save_contacts([], id_index={}, phone_index={}):
+                return {"success": True, "message": f"Deleted {count} contacts", "count": count}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     # ==================== SEARCH METHODS ====================
     
-    def search(self, query: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    def search(self, query: str, fields: Optional[List[str]] = None, *,
+               sort_by: Optional[str] = None, reverse: bool = False,
+               prefix: bool = False) -> List[Dict[str, Any]]:
         """
-        Search contacts by query string.
+        Search contacts by query string. Every whitespace-separated term
+        of the query must appear in the contact (in any searched field).
         
         Args:
             query: Search string
             fields: List of fields to search (default: all searchable fields)
+            sort_by: Sort the matches by this field (default: file order)
+            reverse: True = descending (with sort_by)
+            prefix: Typeahead on names instead (see search_name_prefix;
+                fields is ignored)
         
         Returns:
             List of matching contacts
         """
+        results = self.search_name_prefix(query) if prefix else self._search(query, fields)
+        if sort_by is None:
+            return results
+        # Sort keys are computed for the matches only, not the whole list
+        if sort_by not in self.SORTABLE_FIELDS:
+            sort_by = 'name'
+        try:
+            return self._sorted(results, sort_by, reverse)
+        except Exception as e:
+            print(f"[ContactListManager] Sort error: {e}")
+            return results
+    
+    def _search(self, query: str, fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Unsorted search (see search)."""
         if not query or not query.strip():
             return self.get_all()
         
         contacts = self._load_contacts()
-        query_normalized = self._normalize_text(query.strip())
+        # Whitespace (including _FIELD_SEPARATOR) never occurs inside a term
+        terms = self._normalize_text(query.strip()).split()
         
         # Default search fields
-        if not fields:
-            fields = self.SEARCHABLE_FIELDS
+        if not fields or fields == self.SEARCHABLE_FIELDS:
+            return self._search_indexed(contacts, terms)
         
-        # Filter contacts
-        results = []
-        for contact in contacts:
-            for field in fields:
-                value = str(contact.get(field, ''))
-                if query_normalized in self._normalize_text(value):
-                    results.append(contact)
-                    break  # Avoid duplicate
+        # Filter contacts over their normalized texts for these fields
+        texts = self._search_texts(contacts, fields)
+        contains = self._contains_terms
+        return [c for c, text in zip(contacts, texts) if contains(text, terms)]
+    
+    def _search_texts(self, contacts: List[Dict[str, Any]], fields: List[str]) -> List[str]:
+        """
+        Normalized search text of every contact for fields. Kept with the
+        shared cache entry (computed once per file version and field list)
+        when contacts is the cached list.
+        """
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            return entry.derive('search_text:' + ','.join(fields),
+                                lambda data: [self._search_text(c, fields) for c in data])
+        return [self._search_text(c, fields) for c in contacts]
+    
+    def _search_text(self, contact: Dict[str, Any], fields: List[str]) -> str:
+        """Normalized fields of a contact joined by _FIELD_SEPARATOR."""
+        return _FIELD_SEPARATOR.join(self._field_search_text(contact, field)
+                                     for field in fields)
+    
+    def _field_search_text(self, contact: Dict[str, Any], field: str) -> str:
+        """
+        Normalized text of one field for search. A formatted phone number
+        also gets its bare digits, so '0901234567' finds '0901 234 567'.
+        """
+        text = self._normalize_text(_field_text(contact, field))
+        if field == 'phone':
+            digits = normalize_phone(text)
+            if digits != text:
+                # Whitespace-separated: no search term spans both forms
+                return f"{text} {digits}"
+        return text
+    
+    @staticmethod
+    def _contains_terms(text: str, terms: List[str]) -> bool:
+        """True if every term is a substring of text."""
+        for term in terms:
+            if term not in text:
+                return False
+        return True
+    
+    def _search_indexed(self, contacts: List[Dict[str, Any]], terms: List[str]) -> List[Dict[str, Any]]:
+        """
+        Search all SEARCHABLE_FIELDS through the trigram index kept with the
+        shared cache entry (built once per file version).
+        """
+        entry = self._entry
+        if entry is None or entry.data is not contacts:
+            # Private copy (not from the shared cache): plain scan
+            return [c for c in contacts
+                    if self._contains_terms(self._search_text(c, self.SEARCHABLE_FIELDS), terms)]
+        
+        values, trigrams = entry.derive('search_index', self._build_search_index)
+        # Candidates must contain every trigram of every term
+        grams = {term[j:j + 3] for term in terms for j in range(len(term) - 2)}
+        if not grams:
+            # Terms too short for trigrams: find the longest one in the texts
+            # of all contacts joined into one string (C-level search that
+            # jumps from hit to hit instead of visiting every contact)
+            positions = self._scan_joined(entry, values, max(terms, key=len))
+        else:
+            postings = sorted((trigrams.get(gram, ()) for gram in grams), key=len)
+            if not postings[0]:
+                return []
+            positions = sorted(set(postings[0]).intersection(*postings[1:]))
+        
+        # Verify the substring matches on the survivors: C-level searches
+        # over all fields of a contact at once
+        contains = self._contains_terms
+        return [contacts[i] for i in positions if contains(values[i], terms)]
+    
+    @staticmethod
+    def _scan_joined(entry: JsonStorage.CachedFile, values: List[str], term: str) -> List[int]:
+        """Positions of the contacts whose search text (values, from the search index of entry) contains term."""
+        def build(contacts):
+            starts = []
+            offset = 0
+            for value in values:
+                starts.append(offset)
+                offset += len(value) + 1
+            # Terms never contain whitespace, so no match spans two contacts
+            return '\n'.join(values), starts
+        
+        text, starts = entry.derive('search_joined', build)
+        positions = []
+        count = len(starts)
+        pos = text.find(term)
+        while pos != -1:
+            i = bisect_right(starts, pos) - 1
+            positions.append(i)
+            if i + 1 == count:
+                break
+            pos = text.find(term, starts[i + 1])
+        return positions
+    
+    def search_name_prefix(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Typeahead search on names: every whitespace-separated term of the
+        query must start a word of the contact's name (case- and
+        accent-insensitive). Answered from a sorted word list kept with the
+        shared cache entry, so a lookup costs O(log N) per term plus the
+        matches instead of a scan of every contact.
         
-        return results
+        Args:
+            query: Search string
+        
+        Returns:
+            List of matching contacts, in file order
+        """
+        terms = self._normalize_text(query.strip()).split()
+        if not terms:
+            return self.get_all()
+        
+        contacts = self._load_contacts()
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            words, positions = entry.derive('name_words', self._build_name_words)
+        else:
+            words, positions = self._build_name_words(contacts)
+        
+        matches = None
+        for term in terms:
+            # Words starting with term form one contiguous run of the sorted list
+            lo = bisect_left(words, term)
+            hi = bisect_left(words, term + '\U0010ffff', lo)
+            hits = set(positions[lo:hi])
+            matches = hits if matches is None else matches & hits
+            if not matches:
+                return []
+        return [contacts[i] for i in sorted(matches)]
+    
+    def _build_name_words(self, contacts: List[Dict[str, Any]]) -> tuple:
+        """
+        Sorted normalized name words and, in parallel, the position of the
+        contact each word belongs to.
+        """
+        pairs = sorted((word, i) for i, contact in enumerate(contacts)
+                       for word in set(self._normalize_text(_field_text(contact, 'name')).split()))
+        return [word for word, _ in pairs], [i for _, i in pairs]
     
     def filter_by_group(self, group_name: str) -> List[Dict[str, Any]]:
         """
@@ -413,9 +870,39 @@ class ContactListManager:
             # Return contacts without group
             return [c for c in contacts if not c.get('group', '').strip()]
         
-        # Case-insensitive comparison
-        group_lower = group_name.lower()
-        return [c for c in contacts if c.get('group', '').lower() == group_lower]
+        # Case-insensitive lookup in the group index (positions, in list order)
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            group_index = entry.derive('group_index', self._build_group_index)
+        else:
+            group_index = self._build_group_index(contacts)
+        return [contacts[i] for i in group_index.get(group_name.lower(), ())]
+    
+    @staticmethod
+    def _build_group_index(contacts: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Map lowercased group name -> positions of its contacts."""
+        index: Dict[str, List[int]] = {}
+        for i, c in enumerate(contacts):
+            index.setdefault(str(c.get('group', '')).lower(), []).append(i)
+        return index
+    
+    @staticmethod
+    def _build_group_counts(contacts: List[Dict[str, Any]]) -> Counter:
+        """Histogram of lowercased group name -> number of contacts."""
+        return Counter(str(c.get('group', '')).lower() for c in contacts)
+    
+    def group_counts(self) -> Counter:
+        """
+        Number of contacts per group (keys are lowercased group names).
+        
+        Computed once per file version and kept with the shared cache entry.
+        The returned Counter is shared and must not be modified.
+        """
+        contacts = self._load_contacts()
+        entry = self._entry
+        if entry is not None and entry.data is contacts:
+            return entry.derive('group_counts', self._build_group_counts)
+        return self._build_group_counts(contacts)
     
     def assign_to_group(self, contact_id: int, group_name: str) -> Dict[str, Any]:
         """
@@ -431,24 +918,29 @@ class ContactListManager:
         if not self.username:
             return {"success": False, "message": "Not logged in"}
         
-        contacts = self._load_contacts(use_cache=False)
-        
-        for i, contact in enumerate(contacts):
-            if contact.get('id') == contact_id:
-                contact['group'] = group_name.strip() if group_name else ''
-                contact['updated_at'] = datetime.now().isoformat()
-                contacts[i] = contact
-                
-                if self._save_contacts(contacts):
-                    return {
-                        "success": True, 
-                        "message": f"Assigned contact to group '{group_name}'" if group_name else "Removed contact from group",
-                        "contact": contact
-                    }
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Contact not found"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            contacts = self._load_for_write()
+            
+            i = self._find_index(contact_id)
+            if i is None:
+                return {"success": False, "message": "Contact not found"}
+            
+            contact = {
+                **contacts[i],
+                "group": group_name.strip() if group_name else '',
+                "updated_at": datetime.now().isoformat()
+            }
+            contacts[i] = contact
+            
+            # Phones unchanged: the phone index of the loaded version still holds
+            if self._save_contacts(contacts, id_index=self._id_index, phone_index=self._cached_phone_index()):
+                return {
+                    "success": True, 
+                    "message": f"Assigned contact to group '{group_name}'" if group_name else "Removed contact from group",
+                    "contact": contact
+                }
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     # ==================== SORT METHODS ====================
     
@@ -469,12 +961,7 @@ class ContactListManager:
         contacts = self._load_contacts()
         
         try:
-            sorted_contacts = sorted(
-                contacts, 
-                key=lambda c: self._get_sort_key(c, field),
-                reverse=reverse
-            )
-            return sorted_contacts
+            return self._sorted(contacts, field, reverse)
         except Exception as e:
             print(f"[ContactListManager] Sort error: {e}")
             return contacts
@@ -495,12 +982,7 @@ class ContactListManager:
             field = 'name'
 
         try:
-            sorted_contacts = sorted(
-                contacts,
-                key=lambda c: self._get_sort_key(c, field),
-                reverse=reverse
-            )
-            return sorted_contacts
+            return self._sorted(contacts, field, reverse)
         except Exception as e:
             print(f"[ContactListManager] Sort list error: {e}")
             return contacts
@@ -519,12 +1001,15 @@ class ContactListManager:
         if not self.username:
             return {"success": False, "message": "Not logged in"}
         
-        sorted_contacts = self.sort(field=field, reverse=reverse)
-        
-        if self._save_contacts(sorted_contacts):
-            return {"success": True, "message": f"Sorted by {field}"}
-        else:
-            return {"success": False, "message": "Error saving file"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            self._cache = None  # Revalidate against the file now that we hold the lock
+            sorted_contacts = self.sort(field=field, reverse=reverse)
+            
+            # The phone index maps to ids, not positions: reordering keeps it valid
+            if self._save_contacts(sorted_contacts, phone_index=self._cached_phone_index()):
+                return {"success": True, "message": f"Sorted by {field}"}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     # ==================== UTILITY METHODS ====================
     
@@ -547,7 +1032,7 @@ class ContactListManager:
             if group:
                 groups.add(group)
         
-        return sorted(list(groups))
+        return sorted(groups)
     
     def get_statistics(self) -> Dict[str, Any]:
         """
@@ -557,15 +1042,29 @@ class ContactListManager:
             Dict with metrics
         """
         contacts = self._load_contacts()
-        groups = self.get_groups()
+        
+        # One pass for every metric
+        groups = set()
+        has_email = has_address = has_notes = 0
+        for c in contacts:
+            group = c.get('group', '').strip()
+            if group:
+                groups.add(group)
+            if c.get('email', '').strip():
+                has_email += 1
+            if c.get('address', '').strip():
+                has_address += 1
+            if c.get('notes', '').strip():
+                has_notes += 1
+        groups = sorted(groups)
         
         return {
             "total_contacts": len(contacts),
             "total_groups": len(groups),
             "groups": groups,
-            "has_email": len([c for c in contacts if c.get('email', '').strip()]),
-            "has_address": len([c for c in contacts if c.get('address', '').strip()]),
-            "has_notes": len([c for c in contacts if c.get('notes', '').strip()])
+            "has_email": has_email,
+            "has_address": has_address,
+            "has_notes": has_notes
         }
 
 
@@ -4,9 +4,16 @@ Combines logic from add_contact.py and edit.py to avoid duplicate code.
 """
 from __future__ import annotations
 import os
-import json
 from typing import Dict, List, Optional, Any
 from datetime import datetime
+from . import JsonStorage
+from .Contact import normalize_phone
+
+# Resolved once at import; the directory is created here instead of on every
+# manager instance (one per request)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_DATA_DIR = os.path.join(BASE_DIR, 'Data', 'User', 'user_data')
+os.makedirs(USER_DATA_DIR, exist_ok=True)
 
 
 class ContactManager:
@@ -16,7 +23,9 @@ class ContactManager:
     """
     
     REQUIRED_FIELDS = ['name', 'phone']
-    EDITABLE_FIELDS = ['name', 'phone', 'email', 'address', 'group', 'notes', 'avatar']
+    EDITABLE_FIELDS = frozenset(['name', 'phone', 'email', 'address', 'group', 'notes', 'avatar'])
+    _VALIDATED_FIELDS = frozenset(['name', 'phone', 'email'])  # Fields checked by _validate_contact
+    STREAM_THRESHOLD = 1 << 20  # get() on a cold cache streams files larger than this (bytes)
     
     def __init__(self, username: str = None):
         """
@@ -26,41 +35,127 @@ class ContactManager:
             username: User's login name
         """
         self.username = username
-        self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.data_dir = os.path.join(self.base_dir, 'Data', 'User', 'user_data')
-        
-        # Ensure data directory exists
-        os.makedirs(self.data_dir, exist_ok=True)
+        self.base_dir = BASE_DIR
+        self.data_dir = USER_DATA_DIR
+        # Resolved once: every operation needs it
+        self._file_path = os.path.join(USER_DATA_DIR, f"{username}_contacts.jsonl") if username else None
+        self._entry: Optional[JsonStorage.CachedFile] = None  # Shared cache entry last loaded
+    
+    def clear_cache(self):
+        """Drop the reference to the last loaded entry; reads go through the shared stat-validated cache."""
+        self._entry = None
     
     def _get_contacts_file(self) -> Optional[str]:
-        """Get path to user's contacts file."""
-        if not self.username:
-            return None
+        """Get path to user's contacts file (JSON Lines, one contact per line)."""
+        return self._file_path
+    
+    def _get_legacy_contacts_file(self) -> str:
+        """Path of the pre-JSONL contacts file (a JSON array), migrated on first load."""
         return os.path.join(self.data_dir, f"{self.username}_contacts.json")
     
     def _load_contacts(self) -> List[Dict[str, Any]]:
-        """Load contacts list from JSON file."""
+        """
+        Load contacts list from JSON file.
+        
+        The list comes from the shared parse cache (re-read only when the
+        file changed) and is shared with other readers: never modify it or
+        its contacts, see _load_for_write.
+        """
+        self._entry = None
         file_path = self._get_contacts_file()
-        if not file_path or not os.path.exists(file_path):
+        if not file_path:
             return []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data if isinstance(data, list) else []
-        except (json.JSONDecodeError, IOError) as e:
+            entry = JsonStorage.load_cached_entry(file_path)
+            if not isinstance(entry.data, list):
+                return []
+            self._entry = entry
+            return entry.data
+        except FileNotFoundError:
+            # Not migrated yet: convert the legacy JSON array file once
+            try:
+                migrated = JsonStorage.migrate_to_jsonl(self._get_legacy_contacts_file(), file_path)
+            except (OSError, JsonStorage.JSONDecodeError) as e:
+                # Unreadable legacy file: log it and serve no contacts, as for a broken file
+                print(f"[ContactManager] Error loading contacts: {e}")
+                migrated = False
+            if migrated:
+                return self._load_contacts()
+            return []
+        except (JsonStorage.JSONDecodeError, IOError) as e:
             print(f"[ContactManager] Error loading contacts: {e}")
             return []
     
-    def _save_contacts(self, contacts: List[Dict[str, Any]]) -> bool:
-        """Save contacts list to JSON file."""
+    def _load_for_write(self) -> List[Dict[str, Any]]:
+        """
+        Shallow copy of the contacts list to modify and save (caller holds
+        file_lock). The contact dicts are shared: replace them, never modify them.
+        """
+        return list(self._load_contacts())
+    
+    @staticmethod
+    def _build_id_index(contacts: List[Dict[str, Any]]) -> Dict[int, int]:
+        """Map contact id -> position in the contacts list."""
+        return {contact.get('id'): i for i, contact in enumerate(contacts)}
+    
+    def _id_index(self) -> Dict[int, int]:
+        """Id index of the last loaded list (also valid for its _load_for_write copy), shared: copy before changing."""
+        if self._entry is None:
+            return {}
+        return self._entry.derive('id_index', self._build_id_index)
+    
+    def _find_index(self, contact_id: int) -> Optional[int]:
+        """Position of a contact in the last loaded list, or None (O(1) via id index)."""
+        return self._id_index().get(contact_id)
+    
+    def _save_contacts(self, contacts: List[Dict[str, Any]], id_index: Optional[Dict[int, int]] = None,
+                       phone_index: Optional[Dict[str, List[int]]] = None) -> bool:
+        """
+        Save contacts list to JSON file and update the shared cache.
+        
+        Args:
+            contacts: List of contacts to save
+            id_index: Id index valid for contacts, kept with the cache entry
+            phone_index: Phone index valid for contacts, kept the same way
+        """
+        file_path = self._get_contacts_file()
+        if not file_path:
+            return False
+        
+        try:
+            st = JsonStorage.save_json(file_path, contacts, backup=True)
+            derived = {}
+            if id_index is not None:
+                derived['id_index'] = id_index
+            next_id = self._entry.derived.get('next_id') if self._entry is not None else None
+            if next_id is not None:
+                # Rewrites never add ids: the counter of the version we loaded still holds
+                derived['next_id'] = next_id
+            if phone_index is not None:
+                derived['phone_index'] = phone_index
+            self._entry = JsonStorage.cache_put(file_path, contacts, st, derived or None)
+            return True
+        except IOError as e:
+            print(f"[ContactManager] Error saving contacts: {e}")
+            return False
+    
+    def _append_contact(self, contacts: List[Dict[str, Any]], contact: Dict[str, Any]) -> bool:
+        """Append one contact to the contacts file and the shared cache (contacts: list before the append)."""
         file_path = self._get_contacts_file()
         if not file_path:
             return False
         
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(contacts, f, ensure_ascii=False, indent=2)
+            st = JsonStorage.append_jsonl(file_path, contact)
+            id_index = dict(self._id_index())
+            id_index[contact.get('id')] = len(contacts)
+            derived = {'id_index': id_index, 'next_id': contact.get('id') + 1}
+            phone_index = self._patched_phone_index(contact.get('id'), new_phone=contact.get('phone', ''))
+            if phone_index is not None:
+                derived['phone_index'] = phone_index
+            contacts = contacts + [contact]
+            self._entry = JsonStorage.cache_put(file_path, contacts, st, derived)
             return True
         except IOError as e:
             print(f"[ContactManager] Error saving contacts: {e}")
@@ -73,6 +168,12 @@ class ContactManager:
         max_id = max((contact.get('id', 0) for contact in contacts), default=0)
         return max_id + 1
     
+    def _next_id(self, contacts: List[Dict[str, Any]]) -> int:
+        """Next free contact id: kept with the cache entry, scanned only once per file version."""
+        if self._entry is not None and self._entry.data is contacts:
+            return self._entry.derive('next_id', self._generate_id)
+        return self._generate_id(contacts)
+    
     def _validate_contact(self, contact_data: Dict[str, Any]) -> tuple[bool, str]:
         """
         Validate contact data.
@@ -87,7 +188,7 @@ class ContactManager:
         
         # Validate phone format (basic)
         phone = contact_data.get('phone', '').strip()
-        phone_digits = ''.join(c for c in phone if c.isdigit())
+        phone_digits = normalize_phone(phone)
         if len(phone_digits) < 9:
             return False, "Invalid phone number (minimum 9 digits)"
         
@@ -98,29 +199,65 @@ class ContactManager:
         
         return True, ""
     
-    def _check_duplicate_phone(self, contacts: List[Dict], phone: str, exclude_id: int = None) -> bool:
+    def _check_duplicate_phone(self, contacts: List[Dict], phone_digits: str, exclude_id: int = None) -> bool:
         """
         Check if phone number already exists.
         
         Args:
-            contacts: Current contacts list
-            phone: Phone number to check
+            contacts: Last loaded contacts list (or its _load_for_write copy)
+            phone_digits: Normalized phone number to check (normalize_phone)
             exclude_id: Contact ID to exclude (used when updating)
         
         Returns:
             True if duplicate, False if OK
         """
-        phone_digits = ''.join(c for c in phone if c.isdigit())
+        # One lookup in the phone index kept with the shared cache entry
+        if self._entry is not None:
+            index = self._entry.derive('phone_index', self._build_phone_index)
+        else:
+            index = self._build_phone_index(contacts)
         
+        return any(not (exclude_id and contact_id == exclude_id)
+                   for contact_id in index.get(phone_digits, ()))
+    
+    @staticmethod
+    def _build_phone_index(contacts: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Map phone digits -> ids of the contacts with that number."""
+        index: Dict[str, List[int]] = {}
         for contact in contacts:
-            # Skip if it's the contact being updated
-            if exclude_id and contact.get('id') == exclude_id:
-                continue
-            
-            existing_phone = ''.join(c for c in str(contact.get('phone', '')) if c.isdigit())
-            if phone_digits == existing_phone:
-                return True
-        return False
+            digits = normalize_phone(str(contact.get('phone', '')))
+            index.setdefault(digits, []).append(contact.get('id'))
+        return index
+    
+    def _cached_phone_index(self) -> Optional[Dict[str, List[int]]]:
+        """Phone index of the last loaded list if it was built (still valid when no phone changed)."""
+        return self._entry.derived.get('phone_index') if self._entry is not None else None
+    
+    def _patched_phone_index(self, contact_id: int, old_phone: Optional[str] = None,
+                             new_phone: Optional[str] = None) -> Optional[Dict[str, List[int]]]:
+        """
+        Phone index of the last loaded list with contact_id moved from
+        old_phone to new_phone (None = not in the list before / after), for
+        the entry of the next version. None if the index was never built.
+        
+        The old index and its id lists are shared: the dict and the changed
+        lists are copied, never modified.
+        """
+        index = self._cached_phone_index()
+        if index is None:
+            return None
+        index = dict(index)
+        if old_phone is not None:
+            digits = normalize_phone(str(old_phone))
+            ids = [i for i in index.get(digits, ()) if i != contact_id]
+            if ids:
+                index[digits] = ids
+            else:
+                index.pop(digits, None)
+        if new_phone is not None:
+            digits = normalize_phone(str(new_phone))
+            index[digits] = index.get(digits, []) + [contact_id]
+        return index
     
     def get(self, contact_id: int) -> Dict[str, Any]:
         """
@@ -135,13 +272,37 @@ class ContactManager:
         if not self.username:
             return {"success": False, "message": "Not logged in"}
         
-        contacts = self._load_contacts()
+        handled, contact = self._find_streaming(contact_id)
+        if not handled:
+            contacts = self._load_contacts()
+            i = self._find_index(contact_id)
+            contact = contacts[i] if i is not None else None
         
-        for contact in contacts:
-            if contact.get('id') == contact_id:
-                return {"success": True, "contact": contact}
+        if contact is None:
+            return {"success": False, "message": "Contact not found"}
+        return {"success": True, "contact": contact}
+    
+    def _find_streaming(self, contact_id: int) -> tuple:
+        """
+        Look up one contact in a large file that is not cached yet by
+        scanning it line by line up to the match, instead of parsing it all.
         
-        return {"success": False, "message": "Contact not found"}
+        Returns:
+            Tuple (handled, contact): handled is False when the list is
+            cached or the file is small (or unreadable), then use the cache
+        """
+        file_path = self._get_contacts_file()
+        if not file_path:
+            return False, None
+        try:
+            if (JsonStorage.peek_cached_entry(file_path) is not None
+                    or os.path.getsize(file_path) <= self.STREAM_THRESHOLD):
+                return False, None
+            # Records are compact JSON: only lines holding '"id":<id>' are parsed
+            hint = b'"id":' + JsonStorage.dumps(contact_id)
+            return True, JsonStorage.find_jsonl(file_path, lambda c: c.get('id') == contact_id, hint)
+        except (JsonStorage.JSONDecodeError, OSError):
+            return False, None
     
     def get_all(self) -> List[Dict[str, Any]]:
         """
@@ -170,38 +331,37 @@ class ContactManager:
         if not is_valid:
             return {"success": False, "message": message}
         
-        # Load existing contacts
-        contacts = self._load_contacts()
-        
-        # Check duplicate phone
-        phone = contact_data.get('phone', '').strip()
-        if self._check_duplicate_phone(contacts, phone):
-            return {"success": False, "message": "Phone number already exists in contact list"}
-        
-        # Create new contact with normalized phone (per ER Diagram)
-        phone_normalized = ''.join(c for c in phone if c.isdigit())
-        new_contact = {
-            "id": self._generate_id(contacts),
-            "name": contact_data.get('name', '').strip(),
-            "phone": phone,
-            "phone_normalized": phone_normalized,
-            "email": contact_data.get('email', '').strip(),
-            "address": contact_data.get('address', '').strip(),
-            "group": contact_data.get('group', '').strip(),
-            "notes": contact_data.get('notes', '').strip(),
-            "avatar": contact_data.get('avatar', ''),
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        # Add to list
-        contacts.append(new_contact)
-        
-        # Save
-        if self._save_contacts(contacts):
-            return {"success": True, "message": "Contact added successfully", "contact": new_contact}
-        else:
-            return {"success": False, "message": "Error saving file"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            # Load existing contacts
+            contacts = self._load_contacts()
+            
+            # Check duplicate phone (normalized once, also stored per ER Diagram)
+            phone = contact_data.get('phone', '').strip()
+            phone_normalized = normalize_phone(phone)
+            if self._check_duplicate_phone(contacts, phone_normalized):
+                return {"success": False, "message": "Phone number already exists in contact list"}
+            
+            # Create new contact with normalized phone
+            now = datetime.now().isoformat()
+            new_contact = {
+                "id": self._next_id(contacts),
+                "name": contact_data.get('name', '').strip(),
+                "phone": phone,
+                "phone_normalized": phone_normalized,
+                "email": contact_data.get('email', '').strip(),
+                "address": contact_data.get('address', '').strip(),
+                "group": contact_data.get('group', '').strip(),
+                "notes": contact_data.get('notes', '').strip(),
+                "avatar": contact_data.get('avatar', ''),
+                "created_at": now,
+                "updated_at": now
+            }
+            
+            # Save (append one line, the rest of the file is untouched)
+            if self._append_contact(contacts, new_contact):
+                return {"success": True, "message": "Contact added successfully", "contact": new_contact}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     def update(self, contact_id: int, contact_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -222,39 +382,45 @@ class ContactManager:
         if not is_valid:
             return {"success": False, "message": message}
         
-        # Load existing contacts
-        contacts = self._load_contacts()
-        
-        # Check duplicate phone (excluding current contact)
-        phone = contact_data.get('phone', '').strip()
-        if self._check_duplicate_phone(contacts, phone, exclude_id=contact_id):
-            return {"success": False, "message": "Phone number already exists in contact list"}
-        
-        # Find and update contact with normalized phone (per ER Diagram)
-        phone_normalized = ''.join(c for c in phone if c.isdigit())
-        for i, contact in enumerate(contacts):
-            if contact.get('id') == contact_id:
-                # Update fields while preserving id and created_at
-                updated_contact = {
-                    **contact,  # Keep all existing data
-                    "name": contact_data.get('name', '').strip(),
-                    "phone": phone,
-                    "phone_normalized": phone_normalized,
-                    "email": contact_data.get('email', '').strip(),
-                    "address": contact_data.get('address', '').strip(),
-                    "group": contact_data.get('group', '').strip(),
-                    "notes": contact_data.get('notes', '').strip(),
-                    "avatar": contact_data.get('avatar', contact.get('avatar', '')),
-                    "updated_at": datetime.now().isoformat()
-                }
-                contacts[i] = updated_contact
-                
-                if self._save_contacts(contacts):
-                    return {"success": True, "message": "Update successful", "contact": updated_contact}
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Contact not found"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            # Load existing contacts
+            contacts = self._load_for_write()
+            
+            # Check duplicate phone (excluding current contact)
+            phone = contact_data.get('phone', '').strip()
+            phone_normalized = normalize_phone(phone)
+            if self._check_duplicate_phone(contacts, phone_normalized, exclude_id=contact_id):
+                return {"success": False, "message": "Phone number already exists in contact list"}
+            
+            # Find and update contact with normalized phone (per ER Diagram)
+            i = self._find_index(contact_id)
+            if i is None:
+                return {"success": False, "message": "Contact not found"}
+            
+            contact = contacts[i]
+            # Update fields while preserving id and created_at. A new dict, not
+            # an in-place edit: contact is shared with the cached list (and other
+            # readers) and must stay intact if the save fails.
+            updated_contact = {
+                **contact,  # Keep all existing data
+                "name": contact_data.get('name', '').strip(),
+                "phone": phone,
+                "phone_normalized": phone_normalized,
+                "email": contact_data.get('email', '').strip(),
+                "address": contact_data.get('address', '').strip(),
+                "group": contact_data.get('group', '').strip(),
+                "notes": contact_data.get('notes', '').strip(),
+                "avatar": contact_data.get('avatar', contact.get('avatar', '')),
+                "updated_at": datetime.now().isoformat()
+            }
+            contacts[i] = updated_contact
+            phone_index = self._patched_phone_index(contact_id, old_phone=contact.get('phone', ''), new_phone=phone)
+            
+            # Replaced in place: positions, and so the id index, are unchanged
+            if self._save_contacts(contacts, id_index=self._id_index(), phone_index=phone_index):
+                return {"success": True, "message": "Update successful", "contact": updated_contact}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     def update_partial(self, contact_id: int, fields: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -270,29 +436,51 @@ class ContactManager:
         if not self.username:
             return {"success": False, "message": "Not logged in"}
         
-        contacts = self._load_contacts()
-        
-        for i, contact in enumerate(contacts):
-            if contact.get('id') == contact_id:
-                # Update only provided fields
-                for field in self.EDITABLE_FIELDS:
-                    if field in fields:
-                        contact[field] = fields[field].strip() if isinstance(fields[field], str) else fields[field]
-                
-                contact['updated_at'] = datetime.now().isoformat()
-                contacts[i] = contact
-                
-                # Validate after update
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            contacts = self._load_for_write()
+            
+            i = self._find_index(contact_id)
+            if i is None:
+                return {"success": False, "message": "Contact not found"}
+            
+            # Only provided fields whose value actually differs
+            contact = contacts[i]
+            changed = {}
+            for field, value in fields.items():
+                if field in self.EDITABLE_FIELDS:
+                    if isinstance(value, str):
+                        value = value.strip()
+                    if contact.get(field) != value:
+                        changed[field] = value
+            if not changed:
+                # Nothing to save: the file and updated_at stay as they are
+                return {"success": True, "message": "No changes", "contact": contact}
+            
+            contact = {**contact, **changed}  # Shared with the cache: change a copy
+            
+            # Validate after update; untouched fields were valid when saved
+            if not self._VALIDATED_FIELDS.isdisjoint(changed):
                 is_valid, message = self._validate_contact(contact)
                 if not is_valid:
                     return {"success": False, "message": message}
-                
-                if self._save_contacts(contacts):
-                    return {"success": True, "message": "Update successful", "contact": contact}
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Contact not found"}
+            
+            if 'phone' in changed:
+                contact['phone_normalized'] = normalize_phone(contact['phone'])
+                if self._check_duplicate_phone(contacts, contact['phone_normalized'], exclude_id=contact_id):
+                    return {"success": False, "message": "Phone number already exists in contact list"}
+            
+            contact['updated_at'] = datetime.now().isoformat()
+            if 'phone' in changed:
+                phone_index = self._patched_phone_index(contact_id, old_phone=contacts[i].get('phone', ''),
+                                                        new_phone=contact['phone'])
+            else:
+                phone_index = self._cached_phone_index()
+            contacts[i] = contact
+            
+            if self._save_contacts(contacts, id_index=self._id_index(), phone_index=phone_index):
+                return {"success": True, "message": "Update successful", "contact": contact}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     def delete(self, contact_id: int) -> Dict[str, Any]:
         """
@@ -307,19 +495,28 @@ class ContactManager:
         if not self.username:
             return {"success": False, "message": "Not logged in"}
         
-        contacts = self._load_contacts()
-        
-        # Find and remove contact
-        for i, contact in enumerate(contacts):
-            if contact.get('id') == contact_id:
-                contacts.pop(i)
-                
-                if self._save_contacts(contacts):
-                    return {"success": True, "message": "Contact deleted successfully"}
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Contact not found"}
+        with JsonStorage.file_lock(self._get_contacts_file()):
+            contacts = self._load_for_write()
+            
+            # Find and remove contact
+            i = self._find_index(contact_id)
+            if i is None:
+                return {"success": False, "message": "Contact not found"}
+            
+            # Swap-pop: move the last contact into the gap (file order is not
+            # meaningful), so only one position changes in the index
+            phone_index = self._patched_phone_index(contact_id, old_phone=contacts[i].get('phone', ''))
+            last = contacts.pop()
+            id_index = dict(self._id_index())  # The old index belongs to the shared list
+            del id_index[contact_id]
+            if i < len(contacts):
+                contacts[i] = last
+                id_index[last.get('id')] = i
+            
+            if self._save_contacts(contacts, id_index=id_index, phone_index=phone_index):
+                return {"success": True, "message": "Contact deleted successfully"}
+            else:
+                return {"success": False, "message": "Error saving file"}
 
 
 # ===== BACKWARD COMPATIBILITY WRAPPERS =====
@@ -2,6 +2,7 @@
 Group - Single group entity
 Public attributes: id, name
 """
+import uuid
 from datetime import datetime
 
 
@@ -14,6 +15,8 @@ class Group:
         name: Group name (string)
     """
     
+    __slots__ = ('id', 'name', 'color', 'description', 'is_shared', 'created_at', 'updated_at')
+    
     DEFAULT_COLORS = [
         '#EF4444', '#F97316', '#F59E0B', '#22C55E', '#14B8A6',
         '#3B82F6', '#6366F1', '#A855F7', '#EC4899', '#6B7280'
@@ -31,13 +34,12 @@ class Group:
             description: Group description
             is_shared: 0 = private, 1 = shared
         """
-        self.id = id or str(datetime.now().timestamp()).replace('.', '')
+        self.id = id or uuid.uuid4().hex
         self.name = name
         self.color = color or self.DEFAULT_COLORS[0]
         self.description = description
         self.is_shared = is_shared
-        self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
+        self.created_at = self.updated_at = datetime.now().isoformat()
     
     def to_dict(self) -> dict:
         """Convert Group to dictionary."""
@@ -53,16 +55,28 @@ class Group:
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Group':
-        """Create Group from dictionary."""
-        group = cls(
-            id=data.get('id'),
-            name=data.get('name', ''),
-            color=data.get('color'),
-            description=data.get('description', ''),
-            is_shared=data.get('is_shared', 0)
-        )
-        group.created_at = data.get('created_at', group.created_at)
-        group.updated_at = data.get('updated_at', group.updated_at)
+        """
+        Create Group from dictionary.
+        
+        Attributes are copied straight from data (no __init__), so loading
+        stored groups never calls datetime.now(); only missing id or
+        timestamps are generated.
+        """
+        group = cls.__new__(cls)
+        group.id = data.get('id')
+        group.name = data.get('name', '')
+        group.color = data.get('color') or cls.DEFAULT_COLORS[0]
+        group.description = data.get('description', '')
+        group.is_shared = data.get('is_shared', 0)
+        created_at = data.get('created_at')
+        updated_at = data.get('updated_at')
+        if not group.id or created_at is None or updated_at is None:
+            now = datetime.now().isoformat()
+            group.id = group.id or uuid.uuid4().hex
+            created_at = now if created_at is None else created_at
+            updated_at = now if updated_at is None else updated_at
+        group.created_at = created_at
+        group.updated_at = updated_at
         return group
     
     def update(self, **kwargs):
@@ -4,9 +4,18 @@ Manages CRUD groups following OOP design, independent without depending on other
 """
 from __future__ import annotations
 import os
-import json
 from typing import Dict, List, Optional, Any
 from datetime import datetime
+from . import JsonStorage
+
+# Resolved once at import; the directories are created here instead of on
+# every manager instance (one per request)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_DATA_DIR = os.path.join(BASE_DIR, 'Data', 'User', 'user_data')
+ADMIN_DATA_DIR = os.path.join(BASE_DIR, 'Data', 'Admin', 'admin_data')
+SHARED_GROUPS_FILE = os.path.join(ADMIN_DATA_DIR, 'groups.jsonl')
+os.makedirs(USER_DATA_DIR, exist_ok=True)
+os.makedirs(ADMIN_DATA_DIR, exist_ok=True)
 
 
 class GroupManager:
@@ -30,30 +39,37 @@ class GroupManager:
             username: User's login name (None for admin/shared groups)
         """
         self.username = username
-        self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.base_dir = BASE_DIR
         
         # Determine data directory based on user type
         if username:
-            self.data_dir = os.path.join(self.base_dir, 'Data', 'User', 'user_data')
-            self.groups_file = os.path.join(self.data_dir, f'{username}_groups.json')
+            self.data_dir = USER_DATA_DIR
+            self.groups_file = os.path.join(USER_DATA_DIR, f'{username}_groups.jsonl')
         else:
             # Shared/admin groups
-            self.data_dir = os.path.join(self.base_dir, 'Data', 'Admin', 'admin_data')
-            self.groups_file = os.path.join(self.data_dir, 'groups.json')
+            self.data_dir = ADMIN_DATA_DIR
+            self.groups_file = SHARED_GROUPS_FILE
         
         self._cache: Optional[List[Dict[str, Any]]] = None
-        
-        # Ensure data directory exists
-        os.makedirs(self.data_dir, exist_ok=True)
+        self._entry: Optional[JsonStorage.CachedFile] = None  # Shared cache entry behind _cache
     
     # ==================== PRIVATE METHODS ====================
     
+    def _get_legacy_groups_file(self) -> str:
+        """Path of the pre-JSONL groups file (a JSON array), migrated on first load."""
+        return self.groups_file[:-len('.jsonl')] + '.json'
+    
     def _load_groups(self, use_cache: bool = True) -> List[Dict[str, Any]]:
         """
         Load groups list from JSON file.
         
+        The list comes from the shared parse cache (re-read only when the
+        file changed) and is shared with other readers: never modify it or
+        its groups, see _load_for_write.
+        
         Args:
-            use_cache: Use cache if available
+            use_cache: Use the instance cache if available (False revalidates
+                against the file)
         
         Returns:
             List of group dicts
@@ -62,24 +78,45 @@ class GroupManager:
         if use_cache and self._cache is not None:
             return self._cache
         
-        if not os.path.exists(self.groups_file):
+        self._entry = None
+        try:
+            entry = JsonStorage.load_cached_entry(self.groups_file)
+            groups = entry.data if isinstance(entry.data, list) else []
+            if groups is entry.data:
+                self._entry = entry
+            self._cache = groups
+            return groups
+        except FileNotFoundError:
+            # Not migrated yet: convert the legacy JSON array file once
+            try:
+                migrated = JsonStorage.migrate_to_jsonl(self._get_legacy_groups_file(), self.groups_file)
+            except (OSError, JsonStorage.JSONDecodeError) as e:
+                # Unreadable legacy file: log it and serve no groups, as for a broken file
+                print(f"[GroupManager] Error loading groups: {e}")
+                migrated = False
+            if migrated:
+                return self._load_groups(use_cache)
+            # No groups saved yet (cheaper than checking before every read)
             self._cache = []
             return []
-        
-        try:
-            with open(self.groups_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                groups = data if isinstance(data, list) else []
-                self._cache = groups
-                return groups
-        except (json.JSONDecodeError, IOError) as e:
+        except (JsonStorage.JSONDecodeError, IOError) as e:
             print(f"[GroupManager] Error loading groups: {e}")
             self._cache = []
             return []
     
+    def _load_for_write(self) -> List[Dict[str, Any]]:
+        """
+        Groups list to modify and save, for callers holding file_lock.
+        
+        The shared list is revalidated against the file (re-parsed only if it
+        changed) and copied shallowly. The group dicts are still shared:
+        replace them, never modify them.
+        """
+        return list(self._load_groups(use_cache=False))
+    
     def _save_groups(self, groups: List[Dict[str, Any]]) -> bool:
         """
-        Save groups list to JSON file and update cache.
+        Rewrite the groups file (compacting it) and update cache.
         
         Args:
             groups: List of groups to save
@@ -88,15 +125,88 @@ class GroupManager:
             True if successful, False if error
         """
         try:
-            with open(self.groups_file, 'w', encoding='utf-8') as f:
-                json.dump(groups, f, ensure_ascii=False, indent=2)
-            # Update cache
+            st = JsonStorage.save_json(self.groups_file, groups, backup=True)
+            # Update cache (indexes are rebuilt on demand for the new version)
+            self._cache = groups
+            self._entry = JsonStorage.cache_put(self.groups_file, groups, st)
+            return True
+        except IOError as e:
+            print(f"[GroupManager] Error saving groups: {e}")
+            return False
+    
+    def _append_group(self, groups: List[Dict[str, Any]], next_id: int) -> bool:
+        """
+        Append the last group of groups to the file (one line, the rest of
+        the file is untouched) and update cache.
+        
+        Args:
+            groups: Full groups list, new group already appended
+            next_id: Next free group id
+        
+        Returns:
+            True if successful, False if error
+        """
+        try:
+            st = JsonStorage.append_jsonl(self.groups_file, groups[-1])
             self._cache = groups
+            self._entry = JsonStorage.cache_put(self.groups_file, groups, st, {'next_id': next_id})
             return True
         except IOError as e:
             print(f"[GroupManager] Error saving groups: {e}")
             return False
     
+    @staticmethod
+    def _name_key(name: str) -> str:
+        """Case- and whitespace-insensitive form of a group name."""
+        return name.lower().strip()
+    
+    @staticmethod
+    def _build_id_index(groups: List[Dict[str, Any]]) -> Dict[int, int]:
+        """Map group id -> position in the groups list."""
+        by_id: Dict[int, int] = {}
+        for i, group in enumerate(groups):
+            by_id.setdefault(group.get('id'), i)
+        return by_id
+    
+    @classmethod
+    def _build_name_index(cls, groups: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Map lowercased group name -> positions in the groups list."""
+        by_name: Dict[str, List[int]] = {}
+        for i, group in enumerate(groups):
+            by_name.setdefault(cls._name_key(group.get('name', '')), []).append(i)
+        return by_name
+    
+    @staticmethod
+    def _build_search_column(groups: List[Dict[str, Any]]) -> List[str]:
+        """Lowercased name and description of each group joined by a NUL, in list order."""
+        return [f"{group.get('name', '').lower()}\0{group.get('description', '').lower()}"
+                for group in groups]
+    
+    @staticmethod
+    def _build_sort_keys(groups: List[Dict[str, Any]], field: str) -> List[Any]:
+        """Sort key of every group for field, in list order."""
+        if field == 'name':
+            return [str(g.get('name', '')).lower() for g in groups]
+        return [g.get(field, '') for g in groups]
+    
+    def _index(self, groups: List[Dict[str, Any]], name: str, build) -> Any:
+        """
+        Index of groups, the list last loaded (or its _load_for_write copy,
+        before any change): kept with the shared cache entry, so it is built
+        once per file version.
+        """
+        if self._entry is not None:
+            return self._entry.derive(name, build)
+        return build(groups)
+    
+    def _find_index(self, groups: List[Dict[str, Any]], group_id: int) -> Optional[int]:
+        """Position of a group in groups, or None (O(1) via id index)."""
+        return self._index(groups, 'id_index', self._build_id_index).get(group_id)
+    
+    def _find_by_name(self, groups: List[Dict[str, Any]], name: str) -> List[int]:
+        """Positions of the groups called name (case-insensitive) in groups."""
+        return self._index(groups, 'name_index', self._build_name_index).get(self._name_key(name), [])
+    
     def _generate_id(self, groups: List[Dict[str, Any]]) -> int:
         """Generate new ID for group."""
         if not groups:
@@ -104,6 +214,10 @@ class GroupManager:
         max_id = max((group.get('id', 0) for group in groups), default=0)
         return max_id + 1
     
+    def _next_id(self, groups: List[Dict[str, Any]]) -> int:
+        """Next free group id: kept with the cache entry, scanned only once per file version."""
+        return self._index(groups, 'next_id', self._generate_id)
+    
     def _validate_group(self, group_data: Dict[str, Any]) -> tuple[bool, str]:
         """
         Validate group data.
@@ -111,18 +225,20 @@ class GroupManager:
         Returns:
             Tuple (is_valid, message)
         """
-        # Check required fields
-        for field in self.REQUIRED_FIELDS:
-            if not group_data.get(field, '').strip():
-                return False, f"Field {field} is required"
-        
-        # Validate name length
+        # Validate name (stripped once for the required and length checks)
         name = group_data.get('name', '').strip()
+        if not name:
+            return False, "Field name is required"
         if len(name) < 2:
             return False, "Group name must be at least 2 characters"
         if len(name) > 50:
             return False, "Group name cannot exceed 50 characters"
         
+        # Check other required fields
+        for field in self.REQUIRED_FIELDS:
+            if field != 'name' and not group_data.get(field, '').strip():
+                return False, f"Field {field} is required"
+        
         return True, ""
     
     def _check_duplicate_name(self, groups: List[Dict], name: str, exclude_id: int = None) -> bool:
@@ -137,16 +253,8 @@ class GroupManager:
         Returns:
             True if duplicate, False if OK
         """
-        name_lower = name.lower().strip()
-        
-        for group in groups:
-            if exclude_id and group.get('id') == exclude_id:
-                continue
-            
-            existing_name = group.get('name', '').lower().strip()
-            if name_lower == existing_name:
-                return True
-        return False
+        return any(not (exclude_id and groups[i].get('id') == exclude_id)
+                   for i in self._find_by_name(groups, name))
     
     # ==================== PUBLIC CRUD METHODS ====================
     
@@ -161,12 +269,10 @@ class GroupManager:
             Dict with keys: success, group/message
         """
         groups = self._load_groups()
-        
-        for group in groups:
-            if group.get('id') == group_id:
-                return {"success": True, "group": group}
-        
-        return {"success": False, "message": "Group not found"}
+        i = self._find_index(groups, group_id)
+        if i is None:
+            return {"success": False, "message": "Group not found"}
+        return {"success": True, "group": groups[i]}
     
     def get_by_name(self, name: str) -> Dict[str, Any]:
         """
@@ -179,13 +285,10 @@ class GroupManager:
             Dict with keys: success, group/message
         """
         groups = self._load_groups()
-        name_lower = name.lower().strip()
-        
-        for group in groups:
-            if group.get('name', '').lower().strip() == name_lower:
-                return {"success": True, "group": group}
-        
-        return {"success": False, "message": "Group not found"}
+        positions = self._find_by_name(groups, name)
+        if not positions:
+            return {"success": False, "message": "Group not found"}
+        return {"success": True, "group": groups[positions[0]]}
     
     def get_all(self, use_cache: bool = True) -> List[Dict[str, Any]]:
         """
@@ -199,9 +302,18 @@ class GroupManager:
         """
         return self._load_groups(use_cache=use_cache)
     
+    def clear_cache(self):
+        """Drop the instance cache; the next read revalidates against the file."""
+        self._cache = None
+        self._entry = None
+    
+    def version(self) -> Optional[tuple]:
+        """Signature (mtime_ns, size, inode) of the groups file, None if there is none."""
+        return JsonStorage.file_signature(self.groups_file)
+    
     def reload(self) -> GroupManager:
         """Force reload data from file (clear cache)."""
-        self._cache = None
+        self.clear_cache()
         self._load_groups(use_cache=False)
         return self
     
@@ -220,33 +332,40 @@ class GroupManager:
         if not is_valid:
             return {"success": False, "message": message}
         
-        # Load existing groups
-        groups = self._load_groups(use_cache=False)
-        
-        # Check duplicate name
-        name = group_data.get('name', '').strip()
-        if self._check_duplicate_name(groups, name):
-            return {"success": False, "message": "Group name already exists"}
-        
+        with JsonStorage.file_lock(self.groups_file):
+            # Load existing groups
+            groups = self._load_for_write()
+            
+            # Check duplicate name
+            name = group_data.get('name', '').strip()
+            if self._check_duplicate_name(groups, name):
+                return {"success": False, "message": "Group name already exists"}
+            
+            new_id = self._next_id(groups)
+            new_group = self._new_group(group_data, new_id, len(groups))
+            
+            # Add to list
+            groups.append(new_group)
+            
+            # Save (append one line, the rest of the file is untouched)
+            if self._append_group(groups, next_id=new_id + 1):
+                return {"success": True, "message": "Group added successfully", "group": new_group}
+            else:
+                return {"success": False, "message": "Error saving file"}
+    
+    def _new_group(self, group_data: Dict[str, Any], group_id: int, position: int) -> Dict[str, Any]:
+        """Build a new group record from validated input (position picks the default color)."""
+        now = datetime.now().isoformat()
         # Create new group (per ER Diagram: is_shared field)
-        new_group = {
-            "id": self._generate_id(groups),
-            "name": name,
-            "color": group_data.get('color', self.DEFAULT_COLORS[len(groups) % len(self.DEFAULT_COLORS)]),
+        return {
+            "id": group_id,
+            "name": group_data.get('name', '').strip(),
+            "color": group_data.get('color', self.DEFAULT_COLORS[position % len(self.DEFAULT_COLORS)]),
             "description": group_data.get('description', '').strip(),
             "is_shared": group_data.get('is_shared', 0),  # 0 = private, 1 = shared (per ER Diagram)
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
+            "created_at": now,
+            "updated_at": now
         }
-        
-        # Add to list
-        groups.append(new_group)
-        
-        # Save
-        if self._save_groups(groups):
-            return {"success": True, "message": "Group added successfully", "group": new_group}
-        else:
-            return {"success": False, "message": "Error saving file"}
     
     def update(self, group_id: int, group_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -264,33 +383,35 @@ class GroupManager:
         if not is_valid:
             return {"success": False, "message": message}
         
-        # Load existing groups
-        groups = self._load_groups(use_cache=False)
-        
-        # Check duplicate name (excluding current group)
-        name = group_data.get('name', '').strip()
-        if self._check_duplicate_name(groups, name, exclude_id=group_id):
-            return {"success": False, "message": "Group name already exists"}
-        
-        # Find and update group (preserve is_shared per ER Diagram)
-        for i, group in enumerate(groups):
-            if group.get('id') == group_id:
-                updated_group = {
-                    **group,
-                    "name": name,
-                    "color": group_data.get('color', group.get('color', self.DEFAULT_COLORS[0])),
-                    "description": group_data.get('description', group.get('description', '')).strip(),
-                    "is_shared": group_data.get('is_shared', group.get('is_shared', 0)),
-                    "updated_at": datetime.now().isoformat()
-                }
-                groups[i] = updated_group
-                
-                if self._save_groups(groups):
-                    return {"success": True, "message": "Group updated successfully", "group": updated_group}
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Group not found"}
+        with JsonStorage.file_lock(self.groups_file):
+            # Load existing groups
+            groups = self._load_for_write()
+            
+            # Check duplicate name (excluding current group)
+            name = group_data.get('name', '').strip()
+            if self._check_duplicate_name(groups, name, exclude_id=group_id):
+                return {"success": False, "message": "Group name already exists"}
+            
+            # Find and update group (preserve is_shared per ER Diagram)
+            i = self._find_index(groups, group_id)
+            if i is None:
+                return {"success": False, "message": "Group not found"}
+            
+            group = groups[i]
+            updated_group = {
+                **group,
+                "name": name,
+                "color": group_data.get('color', group.get('color', self.DEFAULT_COLORS[0])),
+                "description": group_data.get('description', group.get('description', '')).strip(),
+                "is_shared": group_data.get('is_shared', group.get('is_shared', 0)),
+                "updated_at": datetime.now().isoformat()
+            }
+            groups[i] = updated_group
+            
+            if self._save_groups(groups):
+                return {"success": True, "message": "Group updated successfully", "group": updated_group}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     def delete(self, group_id: int) -> Dict[str, Any]:
         """
@@ -302,24 +423,27 @@ class GroupManager:
         Returns:
             Dict with keys: success, message
         """
-        groups = self._load_groups(use_cache=False)
-        
-        # Find and remove group
-        for i, group in enumerate(groups):
-            if group.get('id') == group_id:
-                group_name = group.get('name', '')
-                groups.pop(i)
-                
-                if self._save_groups(groups):
-                    return {
-                        "success": True, 
-                        "message": f"Deleted group '{group_name}'",
-                        "group_name": group_name
-                    }
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "Group not found"}
+        with JsonStorage.file_lock(self.groups_file):
+            groups = self._load_for_write()
+            
+            # Find and remove group
+            i = self._find_index(groups, group_id)
+            if i is None:
+                return {"success": False, "message": "Group not found"}
+            
+            group_name = groups[i].get('name', '')
+            # Plain pop, not the swap-pop used for contacts: groups are listed
+            # in file order, and the rewrite below is O(N) anyway
+            groups.pop(i)
+            
+            if self._save_groups(groups):
+                return {
+                    "success": True, 
+                    "message": f"Deleted group '{group_name}'",
+                    "group_name": group_name
+                }
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     def delete_all(self) -> Dict[str, Any]:
         """
@@ -328,13 +452,14 @@ class GroupManager:
         Returns:
             Dict with keys: success, message, count
         """
-        groups = self._load_groups(use_cache=False)
-        count = len(groups)
-        
-        if self._save_groups([]):
-            return {"success": True, "message": f"Deleted {count} groups", "count": count}
-        else:
-            return {"success": False, "message": "Error saving file"}
+        with JsonStorage.file_lock(self.groups_file):
+            groups = self._load_for_write()
+            count = len(groups)
+            
+            if self._save_groups([]):
+                return {"success": True, "message": f"Deleted {count} groups", "count": count}
+            else:
+                return {"success": False, "message": "Error saving file"}
     
     # ==================== UTILITY METHODS ====================
     
@@ -347,7 +472,8 @@ class GroupManager:
         Search groups by name or description.
         
         Args:
-            query: Search string
+            query: Search string; with several words, a group matches when
+                each word is found in its name or description
         
         Returns:
             List of matching groups
@@ -356,17 +482,16 @@ class GroupManager:
             return self.get_all()
         
         groups = self._load_groups()
-        query_lower = query.lower().strip()
-        
-        results = []
-        for group in groups:
-            name = group.get('name', '').lower()
-            description = group.get('description', '').lower()
-            
-            if query_lower in name or query_lower in description:
-                results.append(group)
-        
-        return results
+        # Whitespace (and so the NUL separator) never occurs inside a term
+        terms = query.lower().split()
+        
+        # Lowercased texts are built once per file version, not per search
+        column = self._index(groups, 'search_column', self._build_search_column)
+        if len(terms) == 1:
+            term = terms[0]
+            return [group for group, text in zip(groups, column) if term in text]
+        return [group for group, text in zip(groups, column)
+                if all(term in text for term in terms)]
     
     def sort(self, field: str = 'name', reverse: bool = False) -> List[Dict[str, Any]]:
         """
@@ -385,12 +510,12 @@ class GroupManager:
             field = 'name'
         
         try:
-            sorted_groups = sorted(
-                groups,
-                key=lambda g: str(g.get(field, '')).lower() if field == 'name' else g.get(field, ''),
-                reverse=reverse
-            )
-            return sorted_groups
+            # Keys are a column kept with the cache entry (one per file version
+            # and field); sort positions by key, stable in both directions
+            keys = self._index(groups, f'sort_keys:{field}',
+                               lambda data: self._build_sort_keys(data, field))
+            order = sorted(range(len(groups)), key=keys.__getitem__, reverse=reverse)
+            return [groups[i] for i in order]
         except Exception as e:
             print(f"[GroupManager] Sort error: {e}")
             return groups
@@ -404,11 +529,23 @@ class GroupManager:
         """
         groups = self._load_groups()
         
+        # One pass over the groups for all metrics
+        has_description = 0
+        colors = set()
+        names = []
+        for g in groups:
+            if g.get('description', '').strip():
+                has_description += 1
+            color = g.get('color')
+            if color:
+                colors.add(color)
+            names.append(g.get('name', ''))
+        
         return {
             "total_groups": len(groups),
-            "has_description": len([g for g in groups if g.get('description', '').strip()]),
-            "colors_used": len(set(g.get('color', '') for g in groups if g.get('color'))),
-            "group_names": [g.get('name', '') for g in groups]
+            "has_description": has_description,
+            "colors_used": len(colors),
+            "group_names": names
         }
     
     def export_to_list(self) -> List[str]:
@@ -0,0 +1,493 @@
+"""
+JSON Storage - Shared JSON encode/decode helpers
+Uses orjson when it is installed, falls back to stdlib json otherwise
+"""
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    warnings.warn("fcntl not available, JsonStorage file locks only cover this process",
+                  RuntimeWarning)
+
+
+if orjson is not None:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing
+    # `except json.JSONDecodeError` handlers keep working
+    JSONDecodeError = orjson.JSONDecodeError
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def loads(data: Any) -> Any:
+        """Decode JSON from bytes or str."""
+        return orjson.loads(data)
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        """Encode object to UTF-8 JSON bytes."""
+        option = _OPTIONS | orjson.OPT_INDENT_2 if pretty else _OPTIONS
+        return orjson.dumps(obj, option=option)
+
+    def dumps_line(obj: Any) -> bytes:
+        """Encode object as one newline-terminated JSON Lines record."""
+        return orjson.dumps(obj, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+    def loads(data: Any) -> Any:
+        """Decode JSON from bytes or str."""
+        return json.loads(data)
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        """Encode object to UTF-8 JSON bytes."""
+        if pretty:
+            text = json.dumps(obj, ensure_ascii=False, indent=2)
+        else:
+            text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+        return text.encode('utf-8')
+
+    def dumps_line(obj: Any) -> bytes:
+        """Encode object as one newline-terminated JSON Lines record."""
+        return dumps(obj) + b'\n'
+
+
+# ===== FILE I/O =====
+
+BACKUP_SUFFIX = '.bak'
+JSONL_SUFFIX = '.jsonl'
+
+
+def _is_jsonl(file_path: str) -> bool:
+    """Files named *.jsonl hold a list as JSON Lines (one item per line)."""
+    return file_path.endswith(JSONL_SUFFIX)
+
+
+def _loads_jsonl(lines: Iterable[bytes], file_path: str) -> list:
+    """
+    Decode JSON Lines from an iterable of lines (such as an open binary
+    file, so the whole file is never held as one bytes object); a torn
+    last line (interrupted append) is skipped.
+    """
+    items = []
+    append = items.append
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            append(loads(line))
+        except JSONDecodeError as e:
+            # Only the final line can be torn: every complete line ends with \n
+            if line.endswith(b'\n'):
+                raise
+            print(f"[JsonStorage] Skipping incomplete last line of {file_path}: {e}")
+    return items
+
+
+def find_jsonl(file_path: str, match: Callable[[Any], bool], hint: Optional[bytes] = None) -> Any:
+    """
+    Stream a JSON Lines file and return the first item for which match(item)
+    is true (None if there is none).
+
+    Lines are read and parsed one at a time, so the scan stops at the match
+    and never holds the whole list. Lines not containing hint are skipped
+    without being parsed; in files over MMAP_THRESHOLD they are not even
+    split into lines, the mapped file is searched for hint directly.
+
+    Raises:
+        OSError: File missing or unreadable
+        JSONDecodeError: A complete line is not valid JSON
+    """
+    with open(file_path, 'rb') as f:
+        if hint is not None and os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _find_mapped(mm, match, hint)
+        for line in f:
+            if hint is not None and hint not in line:
+                continue
+            if not line.endswith(b'\n'):
+                continue  # Torn last line (interrupted append)
+            item = loads(line)
+            if match(item):
+                return item
+    return None
+
+
+def _find_mapped(mm: mmap.mmap, match: Callable[[Any], bool], hint: bytes) -> Any:
+    """find_jsonl over a mapped file: jump from one occurrence of hint to the next."""
+    pos = mm.find(hint)
+    while pos != -1:
+        start = mm.rfind(b'\n', 0, pos) + 1
+        end = mm.find(b'\n', pos)
+        if end == -1:
+            return None  # Torn last line (interrupted append)
+        item = loads(mm[start:end])
+        if match(item):
+            return item
+        pos = mm.find(hint, end + 1)
+    return None
+
+
+def _encode(file_path: str, data: Any, pretty: bool) -> bytes:
+    """Encode data in the format implied by the file name."""
+    if _is_jsonl(file_path):
+        return b''.join(map(dumps_line, data))
+    return dumps(data, pretty=pretty)
+
+
+# Larger JSON documents are parsed straight from a read-only mapping of the
+# file (orjson only): no bytes copy of the whole file is made first
+MMAP_THRESHOLD = 1 << 20
+
+
+def _read_file(file_path: str) -> Any:
+    with open(file_path, 'rb') as f:
+        if _is_jsonl(file_path):
+            return _loads_jsonl(f, file_path)
+        if orjson is not None and os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return loads(view)
+        return loads(f.read())
+
+
+def read_json(file_path: str) -> Any:
+    """
+    Read and parse a JSON file (JSON Lines for *.jsonl, returned as a list).
+
+    Falls back to the rolling backup written by save_json(backup=True)
+    when the file itself is corrupt.
+
+    Raises:
+        OSError: File missing or unreadable
+        JSONDecodeError: File and backup are both unusable
+    """
+    try:
+        return _read_file(file_path)
+    except JSONDecodeError as e:
+        try:
+            data = _read_file(file_path + BACKUP_SUFFIX)
+        except (OSError, JSONDecodeError):
+            raise e
+        print(f"[JsonStorage] {file_path} is corrupt, loaded backup instead: {e}")
+        return data
+
+
+def _backup(file_path: str):
+    """Keep the current version of file_path as file_path + '.bak'."""
+    backup_path = file_path + BACKUP_SUFFIX
+    tmp_path = backup_path + '.tmp'
+    try:
+        # The file is about to be replaced by a new inode, so a hard link
+        # preserves the old version without copying any bytes
+        os.link(file_path, tmp_path)
+    except FileNotFoundError:
+        return
+    except OSError:
+        shutil.copyfile(file_path, tmp_path)
+    os.replace(tmp_path, backup_path)
+
+
+def save_json(file_path: str, data: Any, pretty: bool = False, backup: bool = False) -> os.stat_result:
+    """
+    Atomically replace file_path with data encoded as JSON
+    (JSON Lines for *.jsonl, data must then be a list).
+
+    The JSON is written to a temp file in the same directory, fsync'ed and
+    then renamed over the target, so readers never see a partial file.
+
+    Args:
+        file_path: Target JSON file
+        data: Object to save
+        pretty: Indent output (compact by default)
+        backup: Keep the previous version as file_path + '.bak'
+
+    Returns:
+        stat of the written file (for cache_put)
+
+    Raises:
+        OSError: Write failed, file_path is left untouched
+    """
+    payload = _encode(file_path, data, pretty)
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        if backup:
+            _backup(file_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return st
+
+
+def _truncate_torn_line(f, end: int):
+    """Cut an incomplete last line (interrupted append) off an open file."""
+    pos = end
+    while pos > 0:
+        start = max(0, pos - 4096)
+        f.seek(start)
+        i = f.read(pos - start).rfind(b'\n')
+        if i >= 0:
+            f.truncate(start + i + 1)
+            return
+        pos = start
+    f.truncate(0)
+
+
+def append_jsonl(file_path: str, item: Any) -> os.stat_result:
+    """
+    Append one item to a JSON Lines file (created if missing) and fsync it.
+
+    Writes O(1) bytes instead of rewriting the whole list. Callers hold
+    file_lock(file_path) so appends do not interleave with rewrites.
+
+    Returns:
+        stat of the file after the append (for cache_put)
+    """
+    line = dumps_line(item)
+    with open(file_path, 'a+b') as f:
+        # Never glue the new item onto a torn last line
+        end = f.seek(0, os.SEEK_END)
+        if end > 0:
+            f.seek(end - 1)
+            if f.read(1) != b'\n':
+                _truncate_torn_line(f, end)
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+        return os.fstat(f.fileno())
+
+
+def count_jsonl(file_path: str) -> int:
+    """
+    Number of records in a JSON Lines file, counted as newlines without
+    decoding anything (a torn last line has no newline and is not counted).
+
+    Raises:
+        OSError: File missing or unreadable
+    """
+    count = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            count += block.count(b'\n')
+    return count
+
+
+def migrate_to_jsonl(legacy_path: str, file_path: str) -> bool:
+    """
+    One-time conversion of a JSON array file into JSON Lines at file_path.
+
+    Safe to race: the new file only appears if it does not exist yet, and
+    the legacy file is kept as legacy_path + '.bak'.
+
+    Returns:
+        True if file_path exists afterwards
+    """
+    try:
+        data = read_json(legacy_path)
+    except FileNotFoundError:
+        return os.path.exists(file_path)
+    items = data if isinstance(data, list) else []
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_encode(file_path, items, False))
+            f.flush()
+            os.fsync(f.fileno())
+        # link() fails if file_path exists: someone else migrated (and may have written) first
+        os.link(tmp_path, file_path)
+    except FileExistsError:
+        pass
+    except OSError:
+        # No hard links on this filesystem
+        if not os.path.exists(file_path):
+            os.replace(tmp_path, file_path)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    try:
+        os.replace(legacy_path, legacy_path + BACKUP_SUFFIX)
+    except FileNotFoundError:
+        pass
+    print(f"[JsonStorage] Migrated {legacy_path} to {file_path}")
+    return True
+
+
+# ===== WRITE LOCK =====
+
+LOCK_SUFFIX = '.lock'
+LOCK_TIMEOUT = 30.0
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+class LockTimeout(Exception):
+    """Raised when a file lock could not be acquired in time."""
+
+
+@contextmanager
+def file_lock(file_path: str, timeout: float = LOCK_TIMEOUT) -> Iterator[None]:
+    """
+    Hold an exclusive lock on file_path for a read-modify-write cycle.
+
+    Uses flock() on a sidecar file_path + '.lock', which serializes writers
+    across threads and worker processes alike.
+
+    Raises:
+        LockTimeout: Lock not acquired within timeout seconds
+    """
+    deadline = time.monotonic() + timeout
+    if fcntl is None:
+        with _local_locks_guard:
+            lock = _local_locks.setdefault(file_path, threading.Lock())
+        if not lock.acquire(timeout=timeout):
+            raise LockTimeout(f"Timed out waiting for lock on {file_path}")
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    with open(file_path + LOCK_SUFFIX, 'a') as lock_file:
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"Timed out waiting for lock on {file_path}")
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# ===== PARSED FILE CACHE =====
+# Shared by every manager instance in the process: path -> CachedFile.
+# The signature changes whenever the file is rewritten, so stale entries
+# are never served. At most MAX_CACHED_FILES files are kept, least recently
+# used dropped first (with everything derived from them).
+MAX_CACHED_FILES = int(os.environ.get('MAX_CACHED_FILES', 128))
+
+class CachedFile:
+    """One parsed version of a JSON file plus data derived from it (indexes)."""
+
+    __slots__ = ('signature', 'data', 'derived')
+
+    def __init__(self, signature: tuple, data: Any, derived: Optional[Dict[str, Any]] = None):
+        self.signature = signature
+        self.data = data
+        self.derived = derived if derived is not None else {}
+
+    def derive(self, name: str, build: Callable[[Any], Any]) -> Any:
+        """Return build(data), computed once per file version."""
+        value = self.derived.get(name)
+        if value is None:
+            with _cache_lock:
+                value = self.derived.get(name)
+                if value is None:
+                    value = self.derived[name] = build(self.data)
+        return value
+
+
+_cache: "OrderedDict[str, CachedFile]" = OrderedDict()
+_cache_lock = threading.RLock()
+
+
+def _cache_store(file_path: str, entry: CachedFile) -> CachedFile:
+    """Insert entry as the most recently used one and evict beyond MAX_CACHED_FILES (caller holds _cache_lock)."""
+    _cache[file_path] = entry
+    _cache.move_to_end(file_path)
+    while len(_cache) > MAX_CACHED_FILES:
+        _cache.popitem(last=False)
+    return entry
+
+
+def stat_signature(st: os.stat_result) -> tuple:
+    """Identify one version of a file from its stat result."""
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def file_signature(file_path: str) -> Optional[tuple]:
+    """(mtime_ns, size, inode) of file_path, None if it does not exist."""
+    try:
+        return stat_signature(os.stat(file_path))
+    except FileNotFoundError:
+        return None
+
+
+def load_cached_entry(file_path: str) -> CachedFile:
+    """
+    Load a JSON file, reusing the parsed entry while the file is unchanged.
+
+    The entry data is shared between callers and must not be mutated.
+
+    Raises:
+        OSError: File missing or unreadable
+        JSONDecodeError: File is not valid JSON
+    """
+    signature = stat_signature(os.stat(file_path))
+    with _cache_lock:
+        entry = _cache.get(file_path)
+        if entry is not None and entry.signature == signature:
+            _cache.move_to_end(file_path)
+            return entry
+        data = read_json(file_path)
+        return _cache_store(file_path, CachedFile(signature, data))
+
+
+def peek_cached_entry(file_path: str) -> Optional[CachedFile]:
+    """
+    The cached entry of file_path if it is still current, else None.
+    Never reads the file.
+
+    Raises:
+        OSError: File missing
+    """
+    signature = stat_signature(os.stat(file_path))
+    with _cache_lock:
+        entry = _cache.get(file_path)
+    if entry is not None and entry.signature == signature:
+        return entry
+    return None
+
+
+def load_cached(file_path: str) -> Any:
+    """Load a JSON file through the shared cache (see load_cached_entry)."""
+    return load_cached_entry(file_path).data
+
+
+def cache_put(file_path: str, data: Any, st: os.stat_result,
+              derived: Optional[Dict[str, Any]] = None) -> CachedFile:
+    """Record data just written to file_path so the next load is a cache hit."""
+    with _cache_lock:
+        return _cache_store(file_path, CachedFile(stat_signature(st), data, derived))
+
+
+def cache_drop(file_path: str):
+    """Forget the cached data of file_path."""
+    with _cache_lock:
+        _cache.pop(file_path, None)
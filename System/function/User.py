@@ -2,57 +2,98 @@
 User Authentication Module - JSON Primary Storage
 SQLite is used only for backup/sync
 """
-import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, Optional, Tuple
-from .BaseAuthentication import BaseAuthentication
+from .BaseAuthentication import DATA_DIR, BaseAuthentication, cached_username_index, find_username, strip_plain_passwords
+from . import JsonStorage
+
+try:
+    from database import get_db_connection  # Optional SQLite backup (System/database.py)
+except ImportError:
+    get_db_connection = None
+
+USER_ACCOUNT_DIR = os.path.join(DATA_DIR, 'User', 'user_account')
+USER_DATA_DIR = os.path.join(DATA_DIR, 'User', 'user_data')
+USERS_FILE = os.path.join(USER_ACCOUNT_DIR, 'users.json')
+
+# Directories and users.json are created by the first User() of the process only
+_storage_ready = False
+
+# Single background thread for the SQLite backup (created on first use, so
+# after the server forks its workers); one worker keeps syncs in order
+_sqlite_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _write_sqlite_backup(rows: list):
+    """Write users rows to the SQLite backup (runs on the background thread)"""
+    try:
+        with get_db_connection() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO users 
+                (id, username, password, security_question, security_answer, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+    except Exception:
+        pass  # SQLite backup optional
 
 
 class User(BaseAuthentication):
     def __init__(self):
         super().__init__(account_type="user")
-        self.user_account_dir = os.path.join(self.data_dir, 'User', 'user_account')
-        self.user_data_dir = os.path.join(self.data_dir, 'User', 'user_data')
-        self.users_file = os.path.join(self.user_account_dir, 'users.json')
-        
-        # Ensure directories exist
-        os.makedirs(self.user_account_dir, exist_ok=True)
-        os.makedirs(self.user_data_dir, exist_ok=True)
-        
-        # Initialize users.json if not exists
-        if not os.path.exists(self.users_file):
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump({"users": []}, f, ensure_ascii=False, indent=2)
+        self.user_account_dir = USER_ACCOUNT_DIR
+        self.user_data_dir = USER_DATA_DIR
+        self.users_file = USERS_FILE
+        
+        global _storage_ready
+        if not _storage_ready:
+            # Ensure directories exist
+            os.makedirs(self.user_account_dir, exist_ok=True)
+            os.makedirs(self.user_data_dir, exist_ok=True)
+            
+            # Initialize users.json if not exists
+            if not os.path.exists(self.users_file):
+                JsonStorage.save_json(self.users_file, {"users": []})
+            _storage_ready = True
     
-    def _load_users(self) -> dict:
-        """Load users from JSON"""
+    def _load_users(self, use_cache: bool = True) -> dict:
+        """
+        Load users from JSON
+        
+        Args:
+            use_cache: Return the shared read-only snapshot (default); pass
+                False to get a private copy that may be modified and saved
+        """
+        if use_cache:
+            return self._cached_load(self.users_file) or {"users": []}
         return self._load_json(self.users_file) or {"users": []}
     
-    def _save_users(self, data: dict):
+    def _users_index(self) -> Dict[str, Dict]:
+        """{username: user} over the shared users snapshot (read-only)"""
+        return cached_username_index(self.users_file, 'users')
+    
+    def _save_users(self, data: dict, derived: Optional[dict] = None):
         """Save users to JSON"""
-        self._save_json(self.users_file, data)
+        strip_plain_passwords(data.get('users', []))
+        self._save_json(self.users_file, data, derived)
     
     def _sync_to_sqlite(self):
-        """Sync data to SQLite for backup"""
-        try:
-            import sys
-            sys.path.insert(0, self.base_dir)
-            from database import get_db_connection
-            
-            data = self._load_users()
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                for user in data.get('users', []):
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO users 
-                        (id, username, password, password_plain, security_question, security_answer, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (user.get('id'), user.get('username'), user.get('password'),
-                          user.get('password_plain'), user.get('security_question'),
-                          user.get('security_answer'), user.get('created_at')))
-        except:
-            pass  # SQLite backup optional
+        """
+        Sync data to SQLite for backup, in the background: the JSON file is
+        the primary storage and is already saved, so callers do not wait
+        """
+        if get_db_connection is None:
+            return
+        global _sqlite_executor
+        # Snapshot the rows now, the thread must not read a later version
+        rows = [(user.get('id'), user.get('username'), user.get('password'),
+                 user.get('security_question'), user.get('security_answer_hash'),
+                 user.get('created_at'))
+                for user in self._load_users().get('users', [])]
+        if _sqlite_executor is None:
+            _sqlite_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-backup')
+        _sqlite_executor.submit(_write_sqlite_backup, rows)
     
     def register(self, username: str, password: str, security_question: str = "", security_answer: str = "") -> Tuple[bool, str]:
         """
@@ -72,40 +113,39 @@ class User(BaseAuthentication):
         if not is_valid:
             return False, error_msg
         
-        data = self._load_users()
-        users = data.get('users', [])
-        
-        # Check if username exists
-        if any(u['username'] == username for u in users):
-            return False, "Username already exists"
-        
-        # Create new user (per ER Diagram: fullname, email, is_active fields)
-        user_id = self._generate_id(users)
-        hashed_password = self._hash_password(password)
-        
-        new_user = {
-            "id": user_id,
-            "username": username,
-            "password": hashed_password,
-            "password_plain": password,
-            "fullname": "",  # Can be updated via profile
-            "email": "",  # Can be updated via profile
-            "security_question": security_question or "What is your pet's name?",
-            "security_answer": (security_answer or "").lower().strip(),
-            "security_answer_hash": self._hash_password((security_answer or "").lower().strip()),
-            "created_at": datetime.now().isoformat(),
-            "is_active": 1,  # 1 = active, 0 = inactive (per ER Diagram)
-            "contacts_file": f"{username}_contacts.json"
-        }
-        
-        users.append(new_user)
-        data['users'] = users
-        self._save_users(data)
+        with JsonStorage.file_lock(self.users_file):
+            # Check if username exists
+            if username in self._users_index():
+                return False, "Username already exists"
+            
+            data = self._load_users(use_cache=False)
+            users = data.get('users', [])
+            
+            # Create new user (per ER Diagram: fullname, email, is_active fields)
+            user_id = self._next_id(self.users_file, 'users')
+            hashed_password = self._hash_password(password)
+            answer = (security_answer or "").lower().strip()
+            
+            new_user = {
+                "id": user_id,
+                "username": username,
+                "password": hashed_password,
+                "fullname": "",  # Can be updated via profile
+                "email": "",  # Can be updated via profile
+                "security_question": security_question or "What is your pet's name?",
+                "security_answer_hash": self._hash_password(answer),
+                "created_at": datetime.now().isoformat(),
+                "is_active": 1,  # 1 = active, 0 = inactive (per ER Diagram)
+                "contacts_file": f"{username}_contacts.jsonl"
+            }
+            
+            users.append(new_user)
+            data['users'] = users
+            self._save_users(data, {'next_id': user_id + 1})
         
-        # Create empty contacts file for user
+        # Create empty contacts file for user (JSON Lines: empty file = no contacts)
         user_contacts_file = os.path.join(self.user_data_dir, new_user['contacts_file'])
-        with open(user_contacts_file, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+        open(user_contacts_file, 'wb').close()
         
         # Sync to SQLite backup
         self._sync_to_sqlite()
@@ -126,23 +166,18 @@ class User(BaseAuthentication):
         if not username or not password:
             return False, "Please enter all information", None
         
-        data = self._load_users()
-        users = data.get('users', [])
-        
-        user = next((u for u in users if u['username'] == username), None)
+        user = self._users_index().get(username)
         if not user:
             return False, "Username does not exist", None
         
-        if user['password'] != self._hash_password(password):
+        if not self._check_password(user.get('password'), password):
             return False, "Incorrect password", None
         
         return True, "Login successful", user
     
     def get_security_question(self, username: str) -> Optional[str]:
         """Get user's security question"""
-        data = self._load_users()
-        users = data.get('users', [])
-        user = next((u for u in users if u['username'] == username), None)
+        user = self._users_index().get(username)
         return user.get('security_question') if user else None
     
     def verify_security_answer(self, username: str, answer: str) -> Tuple[bool, str]:
@@ -159,15 +194,12 @@ class User(BaseAuthentication):
         if not username or not answer:
             return False, "Please provide all information"
         
-        data = self._load_users()
-        users = data.get('users', [])
-        user = next((u for u in users if u['username'] == username), None)
+        user = self._users_index().get(username)
         
         if not user:
             return False, "User does not exist"
         
-        stored_answer = user.get('security_answer', '').lower().strip()
-        if stored_answer == answer.lower().strip():
+        if self._check_answer(user, answer):
             return True, "Verification successful"
         
         return False, "Incorrect security answer"
@@ -189,31 +221,30 @@ class User(BaseAuthentication):
         if len(new_password) < 6:
             return False, "Password must be at least 6 characters"
         
-        data = self._load_users()
-        users = data.get('users', [])
-        
-        for user in users:
-            if user['username'] == username:
-                if user.get('security_answer', '').lower() != security_answer.lower().strip():
-                    return False, "Incorrect security answer"
-                
-                user['password'] = self._hash_password(new_password)
-                user['password_plain'] = new_password
-                user['password_reset_at'] = datetime.now().isoformat()
-                
-                data['users'] = users
-                self._save_users(data)
-                self._sync_to_sqlite()
-                
-                return True, "Password reset successful"
-        
-        return False, "User does not exist"
+        with JsonStorage.file_lock(self.users_file):
+            data = self._load_users(use_cache=False)
+            users = data.get('users', [])
+            
+            i = find_username(self.users_file, 'users', users, username)
+            if i is None:
+                return False, "User does not exist"
+            
+            user = users[i]
+            if not self._check_answer(user, security_answer):
+                return False, "Incorrect security answer"
+            
+            user['password'] = self._hash_password(new_password)
+            user['password_reset_at'] = datetime.now().isoformat()
+            
+            data['users'] = users
+            self._save_users(data)
+            self._sync_to_sqlite()
+            
+            return True, "Password reset successful"
     
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """Get user by username"""
-        data = self._load_users()
-        users = data.get('users', [])
-        return next((u for u in users if u['username'] == username), None)
+        return self._users_index().get(username)
     
     def get_user_contacts_file(self, username: str) -> Optional[str]:
         """Get path to user's contacts file"""
@@ -267,37 +298,38 @@ class User(BaseAuthentication):
         if not username:
             return {"success": False, "message": "Not logged in"}
         
-        data = self._load_users()
-        users = data.get('users', [])
-        
-        for i, user in enumerate(users):
-            if user.get('username') == username:
-                # Update allowed fields only
-                if 'fullname' in profile_data:
-                    user['fullname'] = profile_data['fullname'].strip()
-                if 'email' in profile_data:
-                    user['email'] = profile_data['email'].strip()
-                if 'phone' in profile_data:
-                    user['phone'] = profile_data['phone'].strip()
-                if 'avatar' in profile_data:
-                    user['avatar'] = profile_data['avatar']
-                
-                user['updated_at'] = datetime.now().isoformat()
-                users[i] = user
-                data['users'] = users
-                
-                if self._save_json(self.users_file, data):
-                    profile = {
-                        "id": user.get('id'),
-                        "username": user.get('username'),
-                        "fullname": user.get('fullname', ''),
-                        "email": user.get('email', ''),
-                        "phone": user.get('phone', ''),
-                        "avatar": user.get('avatar', ''),
-                        "is_active": user.get('is_active', 1)
-                    }
-                    return {"success": True, "message": "Update successful", "profile": profile}
-                else:
-                    return {"success": False, "message": "Error saving file"}
-        
-        return {"success": False, "message": "User not found"}
+        with JsonStorage.file_lock(self.users_file):
+            data = self._load_users(use_cache=False)
+            users = data.get('users', [])
+            
+            for i, user in enumerate(users):
+                if user.get('username') == username:
+                    # Update allowed fields only
+                    if 'fullname' in profile_data:
+                        user['fullname'] = profile_data['fullname'].strip()
+                    if 'email' in profile_data:
+                        user['email'] = profile_data['email'].strip()
+                    if 'phone' in profile_data:
+                        user['phone'] = profile_data['phone'].strip()
+                    if 'avatar' in profile_data:
+                        user['avatar'] = profile_data['avatar']
+                    
+                    user['updated_at'] = datetime.now().isoformat()
+                    users[i] = user
+                    data['users'] = users
+                    
+                    if self._save_json(self.users_file, data):
+                        profile = {
+                            "id": user.get('id'),
+                            "username": user.get('username'),
+                            "fullname": user.get('fullname', ''),
+                            "email": user.get('email', ''),
+                            "phone": user.get('phone', ''),
+                            "avatar": user.get('avatar', ''),
+                            "is_active": user.get('is_active', 1)
+                        }
+                        return {"success": True, "message": "Update successful", "profile": profile}
+                    else:
+                        return {"success": False, "message": "Error saving file"}
+            
+            return {"success": False, "message": "User not found"}
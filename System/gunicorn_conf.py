@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration (production server, replaces app.run):
+    gunicorn -c gunicorn_conf.py wsgi:app
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Pre-forked workers, each with a small thread pool (requests mostly wait on file I/O)
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 4))
+
+# Import the app once in the master, workers fork from it
+preload_app = True
+
+# Recycle workers periodically to bound memory growth of the in-process caches
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 30
+
+# The response cache must be shared by all workers, otherwise a write only
+# invalidates the cache of the worker that handled it
+os.environ.setdefault('CACHE_TYPE', 'FileSystemCache')